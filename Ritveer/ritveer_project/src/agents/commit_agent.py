@@ -1,10 +1,11 @@
-import os, uuid
+import os, uuid, asyncio, functools
 from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
 from typing import Literal
 from src.tools.dao import dao
-from src.tools.messaging.telegram_client import TelegramClient
 from src.tools.pdf.po import purchase_order
+from src.utils.telegram import get_telegram_client
+from src.utils.throttle import telegram_throttle
 
 class CommitEvent(BaseModel):
     ts_utc: datetime
@@ -24,15 +25,22 @@ class CommitState(BaseModel):
     events: list[CommitEvent]
     risk_flags: list[str]
 
-def must_prepay(policy, state) -> bool:
+def must_prepay(policy, state, amount: int | None = None) -> bool:
     if not policy.get("prepay_required"):
         return False
     # new customer or high amount forces prepay
-    amount = state["supplier"]["shortlist"][0]["amount_inr"] * int(state["intake"]["entities"].get("quantity",1))
-    return state.get("customer",{}).get("is_new", True) or amount >= policy.get("prepay_threshold_inr", 3000)
+    if state.get("customer",{}).get("is_new", True):
+        return True
+    if amount is None:
+        amount = state["supplier"]["shortlist"][0]["amount_inr"] * int(state["intake"]["entities"].get("quantity",1))
+    return amount >= policy.get("prepay_threshold_inr", 3000)
+
+@functools.lru_cache(maxsize=2)
+def _ymd(ordinal: int) -> str:
+    return datetime.fromordinal(ordinal).strftime("%Y%m%d")
 
 def po_number(now: datetime, order_id: str) -> str:
-    return f"PO-{now:%Y%m%d}-{order_id[:8].upper()}"
+    return f"PO-{_ymd(now.toordinal())}-{order_id[:8].upper()}"
 
 async def commit_node(state):
     policy = state["policy"]
@@ -44,7 +52,7 @@ async def commit_node(state):
     qty = int(state["intake"]["entities"].get("quantity", 1))
     amount = quote["amount_inr"] * qty
 
-    if must_prepay(policy, state) and state.get("cash",{}).get("status") != "confirmed":
+    if must_prepay(policy, state, amount) and state.get("cash",{}).get("status") != "confirmed":
         # hard stop and route back to Cash or Ops
         state["commit"] = {
             "order_id": state.get("order_id") or str(uuid.uuid4()),
@@ -86,12 +94,16 @@ async def commit_node(state):
         "eta_utc": eta, "status": "placed", "cash_id": state.get("cash",{}).get("payment_id")
     })
 
+    # Both supplier lookups in one round trip
+    supplier_name, supplier_chat = await asyncio.gather(
+        dao.supplier_name(quote["supplier_id"]), dao.supplier_chat_id(quote["supplier_id"]))
+
     # Generate PO PDF
-    client = TelegramClient()
+    client = get_telegram_client()
     pdf_path = await purchase_order({
         "po_number": po_num,
         "order_id": order_id,
-        "supplier_name": await dao.supplier_name(quote["supplier_id"]),
+        "supplier_name": supplier_name,
         "lines": [{"label": state["cluster"]["primary"]["label"], "qty": qty, "price_inr": quote["amount_inr"]}],
         "total_inr": amount,
         "ship_to": state["intake"]["entities"].get("address",""),
@@ -100,22 +112,32 @@ async def commit_node(state):
 
     events.append({"ts_utc": now, "type": "po_created", "data": {"po_number": po_num, "pdf": pdf_path}})
 
-    # Send PO to supplier over Telegram with an Ack button
-    supplier_chat = await dao.supplier_chat_id(quote["supplier_id"])
-    await client.send_text(supplier_chat, f"New PO {po_num} for Order {order_id}. Total INR {amount}.")
-    await client.send_buttons(supplier_chat, "Please acknowledge or decline.",
-        [[{"text":"Acknowledge", "callback_data": f"po_ack:{po_id}"},
-          {"text":"Decline", "callback_data": f"po_decline:{po_id}"}]])
-    events.append({"ts_utc": now, "type":"po_sent", "data":{"supplier_chat": supplier_chat}})
-
-    # Soft reservation hook
-    reserved = await dao.reserve_capacity(quote["supplier_id"], state["cluster"]["primary"]["id"], qty)
-    events.append({"ts_utc": now, "type":"reserve_ok" if reserved else "reserve_failed", "data": {"qty": qty}})
-    status = "reserved" if reserved else "awaiting_supplier_ack"
-
-    # Create shipping task placeholder for manual CSV later
-    await dao.create_ship_task({"order_id": order_id, "status":"pending", "mode":"manual_csv"})
-    events.append({"ts_utc": now, "type":"ship_task", "data":{"mode":"manual_csv"}})
+    # Send PO to supplier over Telegram with an Ack button; kept sequential so
+    # the buttons always arrive after the PO text. If the chat's send backlog
+    # is full the PO is left unsent and the order fails over to Ops.
+    risk_flags = []
+    if await telegram_throttle.wait(supplier_chat):
+        await client.send_text(supplier_chat, f"New PO {po_num} for Order {order_id}. Total INR {amount}.")
+        await telegram_throttle.wait(supplier_chat, force=True)
+        await client.send_buttons(supplier_chat, "Please acknowledge or decline.",
+            [[{"text":"Acknowledge", "callback_data": f"po_ack:{po_id}"},
+              {"text":"Decline", "callback_data": f"po_decline:{po_id}"}]])
+        events.append({"ts_utc": now, "type":"po_sent", "data":{"supplier_chat": supplier_chat}})
+
+        # Soft reservation hook and shipping task placeholder for manual CSV later;
+        # started only once the PO is out, and concurrently since neither needs the other
+        reserved, _ = await asyncio.gather(
+            dao.reserve_capacity(quote["supplier_id"], state["cluster"]["primary"]["id"], qty),
+            dao.create_ship_task({"order_id": order_id, "status":"pending", "mode":"manual_csv"}))
+        events.append({"ts_utc": now, "type":"reserve_ok" if reserved else "reserve_failed", "data": {"qty": qty}})
+        status = "reserved" if reserved else "awaiting_supplier_ack"
+        if not reserved:
+            risk_flags.append("no_capacity_reservation")
+        events.append({"ts_utc": now, "type":"ship_task", "data":{"mode":"manual_csv"}})
+    else:
+        # nothing is reserved or shipped for a PO the supplier never got
+        risk_flags.append("tg_backpressure_drop")
+        status = "failed"
 
     state["commit"] = {
         "order_id": order_id,
@@ -128,6 +150,6 @@ async def commit_node(state):
         "status": status,
         "artifacts": {"po_pdf_path": pdf_path, "po_number": po_num},
         "events": events,
-        "risk_flags": [] if reserved else ["no_capacity_reservation"]
+        "risk_flags": risk_flags
     }
     return state
@@ -1,31 +1,94 @@
-import os, re, time
+import re, time, functools, logging
 from typing import Dict, Any, List
 from pydantic import BaseModel
+from redis.exceptions import RedisError
 from src.tools.policy import policy, is_profanity
+from src.utils.redis_utils import get_async_redis, DEDUPE_LUA, RATE_LUA
+try:
+    import hyperscan
+except ImportError:  # optional; the re patterns below are the fallback
+    hyperscan = None
+
+logger = logging.getLogger(__name__)
 
 JAILBREAK = re.compile(r"(ignore\s+previous|bypass|system\s*prompt|do\s+anything|developer\s+mode)", re.I)
-URL = re.compile(r"https?://\S+", re.I)
-ZERO_WIDTH = re.compile(r"[\u200B-\u200D\uFEFF]")
+# str.translate table that deletes the zero-width characters U+200B-U+200D and U+FEFF
+ZERO_WIDTH_DELETE = dict.fromkeys([0x200B, 0x200C, 0x200D, 0xFEFF])
+WHITESPACE = re.compile(r"\s+")
+# Whitespace runs (group 1) and links in one pass
+WHITESPACE_OR_URL = re.compile(r"(\s+)|https?://\S+", re.I)
+
+def _collapse_or_strip_link(m: re.Match) -> str:
+    return " " if m.group(1) else "[link removed]"
+
+_NS = 1_000_000_000
+
+@functools.lru_cache(maxsize=8)
+def _guard_scripts(redis):
+    """Register the guard scripts once per client; calls then go out as EVALSHA."""
+    # On an asyncio client these are AsyncScript objects and must be awaited
+    return redis.register_script(DEDUPE_LUA), redis.register_script(RATE_LUA)
 
 def sanitize(text: str, guard_policy) -> str:
     """Clean text for downstream safety"""
-    # Remove zero-width characters
-    t = ZERO_WIDTH.sub("", text)
-    # Collapse multiple whitespace
-    t = re.sub(r"\s+", " ", t).strip()
-    # Normalize quotes
-    t = t.replace('"', '"').replace('"', '"')
-    # Handle links per policy
-    if not guard_policy.allow_links: # Assuming allow_links is a policy setting
-        t = URL.sub("[link removed]", t)
-    return t
+    # Remove zero-width characters first, so they can't split a link or a
+    # whitespace run and slip past the scan below
+    t = text.translate(ZERO_WIDTH_DELETE)
+    # Collapse multiple whitespace and handle links per policy in one scan
+    if guard_policy.allow_links: # Assuming allow_links is a policy setting
+        return WHITESPACE.sub(" ", t).strip()
+    return WHITESPACE_OR_URL.sub(_collapse_or_strip_link, t).strip()
+
+@functools.lru_cache(maxsize=16)
+def _compile_blacklist(words: tuple):
+    """One alternation for the whole list, so a check is a single scan"""
+    terms = [re.escape(w) for w in words if w]
+    if not terms:
+        return None
+    return re.compile(rf"\b(?:{'|'.join(terms)})\b", re.I)
 
 def has_blacklist(text: str, words: List[str]) -> bool:
     """Check for blacklisted content"""
-    for w in words:
-        if w and re.search(rf"\b{re.escape(w)}\b", text, re.I):
-            return True
-    return False
+    pattern = _compile_blacklist(tuple(words))
+    return pattern is not None and pattern.search(text) is not None
+
+JAILBREAK_ID, BLACKLIST_ID = 0, 1
+
+@functools.lru_cache(maxsize=16)
+def _hs_database(words: tuple):
+    """Jailbreak and blacklist patterns compiled into one Hyperscan database"""
+    expressions, ids = [JAILBREAK.pattern.encode()], [JAILBREAK_ID]
+    blacklist = _compile_blacklist(words)
+    if blacklist is not None:
+        expressions.append(blacklist.pattern.encode())
+        ids.append(BLACKLIST_ID)
+    flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8
+             | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH)
+    db = hyperscan.Database()
+    try:
+        db.compile(expressions=expressions, ids=ids, elements=len(ids), flags=[flags] * len(ids))
+    except hyperscan.error as e:
+        logger.warning("Hyperscan compile failed, using re for guard scans: %s", e)
+        return None
+    return db
+
+def scan_guard_patterns(text: str, words: List[str]) -> set:
+    """Ids of the detection patterns (JAILBREAK_ID, BLACKLIST_ID) found in text"""
+    db = _hs_database(tuple(words)) if hyperscan is not None else None
+    hits = set()
+    if db is None:
+        if JAILBREAK.search(text):
+            hits.add(JAILBREAK_ID)
+        if has_blacklist(text, words):
+            hits.add(BLACKLIST_ID)
+        return hits
+
+    def on_match(id, start, end, flags, context):
+        hits.add(id)
+
+    # One pass over the text for every pattern
+    db.scan(text.encode("utf-8"), match_event_handler=on_match)
+    return hits
 
 class GuardResult(BaseModel):
     action: str = "pass"  # pass, clarify, ops, drop
@@ -44,7 +107,7 @@ async def guard_node(state: Dict[str, Any]) -> Dict[str, Any]:
     chat_id = str(intake.get("meta", {}).get("chat_id", "anon"))
 
     guard_policy = policy.get().guard
-    redis = state.get("redis")
+    redis = get_async_redis()
 
     reasons = []
     action = "pass"
@@ -55,36 +118,43 @@ async def guard_node(state: Dict[str, Any]) -> Dict[str, Any]:
         reasons.append("invalid_signature")
         action = "drop"
 
-    # 2) Replay protection - dedupe requests
-    if req_id and redis and action != "drop":
-        key = f"guard:seen:{req_id}"
-        if not redis.setnx(key, 1):
+    # 2) Replay protection and 3) per-user rate limiting share one pipelined
+    # round-trip; a replayed request therefore still counts toward the burst
+    check_dedupe = bool(req_id) and action != "drop"
+    check_rate = chat_id != "anon" and action != "drop"
+    burst_n = guard_policy.per_user_burst_n
+    window_s = guard_policy.per_user_burst_window_s
+
+    if check_dedupe or check_rate:
+        dedupe_script, rate_script = _guard_scripts(redis)
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                if check_dedupe:
+                    await dedupe_script(keys=[f"guard:seen:{req_id}"], args=[guard_policy.dedupe_ttl_s], client=pipe)
+                if check_rate:
+                    # Use sliding window by rounding timestamp
+                    window_key = f"guard:rate:{chat_id}:{time.time_ns() // (window_s * _NS)}"
+                    await rate_script(keys=[window_key], args=[window_s], client=pipe)
+                results = await pipe.execute()
+        except RedisError as e:
+            # Redis being down shouldn't take intake with it; skip both checks
+            logger.warning("Guard Redis checks skipped: %s", e)
+            check_dedupe = check_rate = False
+            results = []
+
+        if check_dedupe and not results[0]:
             reasons.append("replay")
             action = "drop"
-        else:
-            ttl_sec = guard_policy.dedupe_ttl_s
-            redis.expire(key, ttl_sec)
 
-    # 3) Rate limiting per user
-    if chat_id != "anon" and redis and action != "drop":
-        burst_n = guard_policy.per_user_burst_n
-        window_s = guard_policy.per_user_burst_window_s
-
-        # Use sliding window by rounding timestamp
-        window_key = f"guard:rate:{chat_id}:{int(time.time() // window_s)}"
-        count = redis.incr(window_key, 1)
-
-        if count == 1:
-            redis.expire(window_key, window_s)
-
-        if count > burst_n:
+        if check_rate and action != "drop" and results[-1] > burst_n:
             reasons.append("high_velocity")
             action = "clarify"
             ttl = window_s
 
+    hits = scan_guard_patterns(text, guard_policy.blacklist_words)
+
     # 4) Blacklisted content - route to ops for review
-    blacklist_words = guard_policy.blacklist_words
-    if has_blacklist(text, blacklist_words) and action != "drop":
+    if BLACKLIST_ID in hits and action != "drop":
         reasons.append("blacklist_hit")
         action = "ops"
 
@@ -94,7 +164,7 @@ async def guard_node(state: Dict[str, Any]) -> Dict[str, Any]:
         action = "clarify"
 
     # 6) Prompt injection detection
-    if JAILBREAK.search(text) and action == "pass":
+    if JAILBREAK_ID in hits and action == "pass":
         reasons.append("prompt_injection")
         action = "clarify"
 
@@ -1,27 +1,34 @@
 import time
 import hashlib
-import os
-import redis
+import functools
+import logging
+from redis.exceptions import RedisError
 from typing import Optional, Literal, Dict, List, Any
 from pydantic import ValidationError
+try:
+    import xxhash
+except ImportError:  # optional; blake2b from hashlib is the fallback
+    xxhash = None
 
 from ritveer_project.src.graph.state import IntakeOutput
+from src.utils.redis_utils import DEDUPE_LUA, get_async_redis
 
-# Initialize Redis client
-# In a real application, this would be configured more robustly,
-# e.g., using a connection pool or dependency injection.
-try:
-    r = redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
-except Exception as e:
-    print(f"Could not connect to Redis: {e}. Proceeding without Redis for now.")
-    r = None # Set r to None if connection fails
+logger = logging.getLogger(__name__)
+
+@functools.lru_cache(maxsize=1)
+def _dedupe_script():
+    return get_async_redis().register_script(DEDUPE_LUA)
 
 def make_request_id(msg_sid: str, body: str) -> str:
     """Generates a unique request ID for idempotency."""
-    digest = hashlib.sha256(body.encode('utf-8')).hexdigest()[:16]
+    # A 64-bit content id is all we need here, not a cryptographic digest
+    if xxhash is not None:
+        digest = xxhash.xxh3_64_hexdigest(body.encode('utf-8'))
+    else:
+        digest = hashlib.blake2b(body.encode('utf-8'), digest_size=8).hexdigest()
     return f"{msg_sid}-{digest}"
 
-def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "ops_console"], msg_sid: Optional[str] = None, twilio_signature: Optional[str] = None, request_url: Optional[str] = None) -> IntakeOutput:
+async def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "ops_console"], msg_sid: Optional[str] = None, twilio_signature: Optional[str] = None, request_url: Optional[str] = None, upstream_risk_flags: Optional[List[str]] = None) -> IntakeOutput:
     """
     Processes an inbound message through the Intake pipeline.
 
@@ -31,13 +38,24 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
         msg_sid: The Message SID from Twilio, if applicable.
         twilio_signature: The X-Twilio-Signature header, if applicable.
         request_url: The full URL of the incoming webhook request, if applicable.
+        upstream_risk_flags: Flags already raised upstream, e.g. "invalid_signature"
+            from the webhook's signature check; they are kept on the output.
 
     Returns:
         An IntakeOutput Pydantic model instance.
     """
     start_time = time.perf_counter()
     timings_ms: Dict[str, int] = {}
-    risk_flags: List[str] = []
+    prev_ms = 0
+
+    def _tick(stage: str) -> None:
+        # Each stage's timing is the delta since the previous tick
+        nonlocal prev_ms
+        cur_ms = int((time.perf_counter() - start_time) * 1000)
+        timings_ms[stage] = cur_ms - prev_ms
+        prev_ms = cur_ms
+
+    risk_flags: List[str] = list(upstream_risk_flags or ())
     meta: Dict[str, str] = {}
 
     # --- 1. Idempotency and de-dupe ---
@@ -46,14 +64,18 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
     request_id = "req_unknown"
     if msg_sid:
         request_id = make_request_id(msg_sid, raw_message)
-        if r and not r.setnx(f"intake:seen:{request_id}", 1):
+        try:
+            # Expire after 2 minutes
+            first_seen = await _dedupe_script()(keys=[f"intake:seen:{request_id}"], args=[120])
+        except RedisError:
+            logger.warning("Redis unavailable; skipping de-duplication", exc_info=True)
+            first_seen = True
+        if not first_seen:
             meta["duplicate"] = "true"
             # If it's a duplicate, we might want to short-circuit or return a minimal IntakeOutput
             # For now, we'll let it proceed but mark it.
-        if r:
-            r.expire(f"intake:seen:{request_id}", 120) # Expire after 2 minutes
 
-    timings_ms["dedupe"] = int((time.perf_counter() - start_time) * 1000)
+    _tick("dedupe")
 
     # --- 2. Security gate (Twilio signature verification) ---
     # This is primarily handled in the webhook, but risk_flags can be set here
@@ -63,11 +85,10 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
     # Example: if not is_twilio_signature_valid(twilio_signature, request_url, raw_message):
     #     risk_flags.append("invalid_signature")
     # For now, we'll assume valid if twilio_signature is provided and not explicitly marked invalid.
-    # If the webhook already set "invalid_signature", it would be passed in via a state object,
-    # which is not directly available here. This function assumes a "clean" raw_message.
-    # The webhook will set the risk_flags in the state directly if signature is invalid.
+    # If the webhook already set "invalid_signature", it arrives in upstream_risk_flags and
+    # is already in risk_flags, so the next hop below is Guard.
 
-    timings_ms["security_gate"] = int((time.perf_counter() - start_time) * 1000) - timings_ms.get("dedupe", 0)
+    _tick("security_gate")
 
     # --- 3. Lightweight language and spam checks ---
     language = "en" # Default
@@ -82,7 +103,7 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
     # if contains_profanity(raw_message):
     #     risk_flags.append("profane")
 
-    timings_ms["lang_spam_check"] = int((time.perf_counter() - start_time) * 1000) - sum(timings_ms.values())
+    _tick("lang_spam_check")
 
     # --- 4. Normalization ---
     normalized_text = raw_message.strip()
@@ -91,7 +112,7 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
     # normalized_text = normalize_numbers(normalized_text)
     # ... phone, address normalization helpers
 
-    timings_ms["normalization"] = int((time.perf_counter() - start_time) * 1000) - sum(timings_ms.values())
+    _tick("normalization")
 
     # --- 5. Intent classification tiered ---
     intent = "unsupported"
@@ -135,7 +156,7 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
         intent_confidence = 0.5
         priority = "normal"
 
-    timings_ms["intent_classification"] = int((time.perf_counter() - start_time) * 1000) - sum(timings_ms.values())
+    _tick("intent_classification")
 
     # --- 6. Entity extraction and slot analysis ---
     entities: Dict[str, str] = {}
@@ -149,7 +170,7 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
     #     entities["item"] = extract_item(normalized_text)
     #     entities["quantity"] = extract_quantity(normalized_text)
 
-    timings_ms["entity_slot_analysis"] = int((time.perf_counter() - start_time) * 1000) - sum(timings_ms.values())
+    _tick("entity_slot_analysis")
 
     # --- 7. Policy and guardrails ---
     # Example:
@@ -160,7 +181,7 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
     # if check_velocity_limit(customer_id, channel):
     #     risk_flags.append("velocity_limit_exceeded")
 
-    timings_ms["policy_guardrails"] = int((time.perf_counter() - start_time) * 1000) - sum(timings_ms.values())
+    _tick("policy_guardrails")
 
     # --- 8. Next hop hint ---
     next_actions_hint: Optional[str] = None
@@ -177,7 +198,7 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
     else:
         next_actions_hint = "cluster_agent"
 
-    timings_ms["next_hop_hint"] = int((time.perf_counter() - start_time) * 1000) - sum(timings_ms.values())
+    _tick("next_hop_hint")
 
     # Construct the IntakeOutput
     try:
@@ -200,7 +221,7 @@ def run_intake_pipeline(raw_message: str, channel: Literal["whatsapp", "web", "o
             timings_ms=timings_ms
         )
     except ValidationError as e:
-        print(f"IntakeOutput validation error: {e}")
+        logger.warning("IntakeOutput validation error: %s", e)
         # Fallback to a minimal valid output or raise an error
         output = IntakeOutput(
             request_id=request_id,
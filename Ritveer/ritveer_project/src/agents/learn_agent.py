@@ -1,7 +1,20 @@
-import uuid, hashlib, json
+import asyncio, uuid, hashlib, json, logging, time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from pydantic import BaseModel
+from redis.exceptions import RedisError
 from src.tools.dao import dao
+from src.utils.redis_utils import get_async_redis
+try:
+    from blake3 import blake3
+except ImportError:  # optional; hashlib.blake2b is the fallback
+    blake3 = None
+try:
+    import orjson
+except ImportError:  # optional; stdlib json is the fallback
+    orjson = None
+
+logger = logging.getLogger(__name__)
 
 class LearnOutput(BaseModel):
     log_id: str
@@ -10,9 +23,97 @@ class LearnOutput(BaseModel):
     anomalies: list[str]          # ["price_outlier","lead_time_slip"]
     metrics: dict                 # counters and durations
 
+def _json_default(o):
+    # Matches orjson's RFC 3339 output so both paths hash the same bytes
+    if isinstance(o, datetime):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def snapshot_bytes(obj: dict) -> bytes:
+    """Canonical JSON for a snapshot: sorted keys, compact, UTF-8"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, sort_keys=True, separators=(",",":"), ensure_ascii=False,
+                      default=_json_default).encode()
+
 def content_hash(obj: dict) -> str:
-    data = json.dumps(obj, sort_keys=True, separators=(",",":")).encode()
-    return hashlib.sha256(data).hexdigest()
+    # Content id for the event log, not a security boundary, so a faster
+    # hash than SHA-256 is fine; both give 32-byte digests
+    data = snapshot_bytes(obj)
+    if blake3 is not None:
+        return blake3(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+# Commit statuses that count as a won order
+WON_STATUSES = frozenset({"placed","reserved","awaiting_supplier_ack","backorder"})
+
+LEARNED_TTL_S = 3600
+# In-process mirror of the learn:<order_id> keys, so a re-entry on the same
+# worker doesn't even need the Redis round-trip
+_learned: "OrderedDict[str, str]" = OrderedDict()
+_LEARNED_MAX = 4096
+
+async def already_learned(order_id: str, h: str) -> bool:
+    """True if this exact snapshot was already applied for order_id"""
+    if _learned.get(order_id) == h:
+        return True
+    try:
+        return await get_async_redis().get(f"learn:{order_id}") == h
+    except RedisError:
+        return False
+
+async def mark_learned(order_id: str, h: str) -> None:
+    _learned[order_id] = h
+    _learned.move_to_end(order_id)
+    if len(_learned) > _LEARNED_MAX:
+        _learned.popitem(last=False)
+    try:
+        await get_async_redis().setex(f"learn:{order_id}", LEARNED_TTL_S, h)
+    except RedisError:
+        pass
+
+# Coverage is a per-(cluster, region) aggregate; one recompute a minute per
+# pair is enough, however many orders land in between. Orders inside the
+# window are picked up by a single trailing recompute when it closes.
+COVERAGE_MIN_INTERVAL_S = 60
+_coverage_last_run: "OrderedDict[tuple, float]" = OrderedDict()
+_COVERAGE_KEYS_MAX = 4096
+# Pending trailing recomputes; holding the task keeps it from being collected
+_coverage_trailing: dict[tuple, asyncio.Task] = {}
+
+def _claim_coverage(key: tuple) -> None:
+    _coverage_last_run[key] = time.monotonic()
+    _coverage_last_run.move_to_end(key)
+    if len(_coverage_last_run) > _COVERAGE_KEYS_MAX:
+        _coverage_last_run.popitem(last=False)
+
+async def _trailing_coverage(dao, key: tuple, delay_s: float) -> None:
+    try:
+        await asyncio.sleep(delay_s)
+        _claim_coverage(key)
+        await dao.recompute_coverage(*key)
+    except Exception:
+        logger.exception("LEARN AGENT: Trailing coverage recompute failed for %s", key)
+    finally:
+        _coverage_trailing.pop(key, None)
+
+async def refresh_coverage(dao, cluster_id, region) -> bool:
+    """
+    Recomputes the pair's coverage now if it wasn't recomputed in the last
+    COVERAGE_MIN_INTERVAL_S and returns True. Otherwise makes sure one
+    recompute runs when the window closes, and returns False.
+    """
+    key = (cluster_id, region)
+    if key in _coverage_trailing:
+        return False  # the pending recompute will see this order's writes
+    elapsed = time.monotonic() - _coverage_last_run.get(key, float("-inf"))
+    if elapsed < COVERAGE_MIN_INTERVAL_S:
+        _coverage_trailing[key] = asyncio.create_task(
+            _trailing_coverage(dao, key, COVERAGE_MIN_INTERVAL_S - elapsed))
+        return False
+    _claim_coverage(key)
+    await dao.recompute_coverage(cluster_id, region)
+    return True
 
 async def learn_node(state):
     now = datetime.now(timezone.utc)
@@ -29,52 +130,67 @@ async def learn_node(state):
         "policy": state.get("policy", {}),
     }
     h = content_hash(snap)
-    await dao.append_event(state["order_id"], "final_snapshot", {"hash": h})
     log["log_id"] = h
 
-    # Extract facts
+    # Retries and idempotent re-entry carry the same snapshot; nothing to learn
     order_id = state.get("order_id")
-    cm = state.get("commit", {})
-    sp = state.get("supplier", {})
-    cl = state.get("cluster", {}).get("primary", {})
-    qty = int(state.get("intake", {}).get("entities", {}).get("quantity", 1) or 1)
+    if order_id and await already_learned(order_id, h):
+        return state
+
+    # Extract facts, reusing the sections already pulled into the snapshot
+    cm = snap["commit"] or {}
+    sp = snap["supplier"] or {}
+    cl = (snap["cluster"] or {}).get("primary") or {}
+    qty = int(((snap["intake"] or {}).get("entities") or {}).get("quantity", 1) or 1)
     shortlist = sp.get("shortlist", [{"supplier_id": None, "amount_inr": 0},])
     supplier_id = shortlist[0]["supplier_id"]
     price_unit = shortlist[0]["amount_inr"]
     price = price_unit * qty
     region = cl.get("location_hint", {}).get("region", "unknown")
 
-    won = cm.get("status") in {"placed","reserved","awaiting_supplier_ack","backorder"}
+    won = cm.get("status") in WON_STATUSES
     refund = False  # fill later if you implement returns
     sla_hit = None  # fill when delivered
 
-    await dao.upsert_fact_order({
-        "order_id": order_id, "cluster_id": cl.get("id"), "supplier_id": supplier_id,
-        "qty": qty, "price_inr": price_unit, "lead_time_days": cl.get("lead_time_days", 7),
-        "region": region, "won": won, "refund": refund, "sla_hit": sla_hit, "amount_inr": price
-    })
+    # The snapshot event, fact row, price book, supplier stats and centroid
+    # each take explicit inputs, so they are written concurrently
+    writes = [
+        dao.append_event(state["order_id"], "final_snapshot", {"hash": h}),
+        dao.upsert_fact_order({
+            "order_id": order_id, "cluster_id": cl.get("id"), "supplier_id": supplier_id,
+            "qty": qty, "price_inr": price_unit, "lead_time_days": cl.get("lead_time_days", 7),
+            "region": region, "won": won, "refund": refund, "sla_hit": sla_hit, "amount_inr": price
+        }),
+        # 2) price book
+        dao.update_price_book(cl.get("id"), price_unit),
+    ]
+    # 3) supplier stats
+    if supplier_id:
+        writes.append(dao.update_supplier_stats(supplier_id, cl.get("id"), cl.get("lead_time_days", 7), won))
+    # 5) centroid update
+    has_centroid = "centroid" in cl and cl["centroid"]
+    if has_centroid:
+        writes.append(dao.update_cluster_centroid(cl.get("id"), cl["centroid"]))
 
-    # 2) price book
-    band = await dao.update_price_book(cl.get("id"), price_unit)
+    results = await asyncio.gather(*writes)
+    band = results[2]
     log["updates"]["price_book"] = 1
     # flag outlier
     if price_unit > band["p90_inr"] * state["policy"].get("price_outlier_multiplier", 1.15):
         log["anomalies"].append("price_outlier")
-
-    # 3) supplier stats
     if supplier_id:
-        await dao.update_supplier_stats(supplier_id, cl.get("id"), cl.get("lead_time_days", 7), won)
         log["updates"]["supplier_stats"] = 1
 
-    # 4) coverage index
-    await dao.recompute_coverage(cl.get("id"), region)
-    log["updates"]["coverage"] = 1
+    # 4) coverage index, recomputed once the writes above have landed
+    if await refresh_coverage(dao, cl.get("id"), region):
+        log["updates"]["coverage"] = 1
 
-    # 5) centroid update
-    if "centroid" in cl and cl["centroid"]:
-        await dao.update_cluster_centroid(cl.get("id"), cl["centroid"])
+    if has_centroid:
         log["updates"]["centroid"] = 1
 
+    if order_id:
+        await mark_learned(order_id, h)
+
     # 6) labels
     log["labels"] = {"won": won, "refund": refund, "sla_hit": sla_hit}
 
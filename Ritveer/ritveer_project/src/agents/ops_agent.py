@@ -1,4 +1,4 @@
-import uuid
+import asyncio, uuid
 from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel
 from typing import Optional, Literal, List
@@ -23,27 +23,40 @@ REASONS = {
     "cash_not_confirmed": ("high",      30, ["reroute:Cash","cancel"]),
     "price_outlier":      ("med",       60, ["approve","deny"]),
     "capacity_fail":      ("high",      30, ["reroute:Supplier","cancel"]),
+    "tg_backpressure_drop": ("high",    15, ["approve","cancel"]),
+}
+
+# Lower rank wins when several reasons apply: severity first, then urgency
+PRIORITY = {
+    "invalid_signature": 0, "cash_not_confirmed": 1, "tg_backpressure_drop": 2, "capacity_fail": 3,
+    "awaiting_review": 4, "quality_decline": 5, "low_coverage": 6, "price_outlier": 7, "low_confidence": 8,
+}
+REASON_SET = frozenset(REASONS)
+
+OPEN_STATUSES = frozenset({"open","acked"})
+
+# Fixed (non-reroute) actions that get their own button: text, callback verb
+ACTION_BUTTONS = {
+    "confirm_payment": ("Confirm payment", "confirm_cash"),
 }
 
 def ops_reason_and_actions(state) -> tuple[str, List[str], str, datetime]:
     # pick the strongest reason in priority order
-    candidates = []
-    flags = []
-    flags += state.get("intake",{}).get("risk_flags", [])
-    flags += state.get("cluster",{}).get("primary",{}).get("risk_flags", [])
-    flags += state.get("supplier",{}).get("risk_flags", [])
-    if state.get("cash",{}).get("status") == "awaiting_review":
-        candidates.append("awaiting_review")
-    if state.get("commit",{}).get("status") == "failed" and "cash_not_confirmed" in state.get("commit",{}).get("risk_flags",[]):
-        candidates.append("cash_not_confirmed")
-    if state.get("learn",{}).get("anomalies", []):
-        candidates.extend(state["learn"]["anomalies"])
-
-    # map flags to reasons we care about
-    for f in flags:
-        if f in REASONS: candidates.append(f)
+    cluster_primary = (state.get("cluster") or {}).get("primary") or {}
+    commit = state.get("commit") or {}
+    reasons = set((state.get("intake") or {}).get("risk_flags") or ())
+    reasons.update(cluster_primary.get("risk_flags") or ())
+    reasons.update((state.get("supplier") or {}).get("risk_flags") or ())
+    reasons.update((state.get("learn") or {}).get("anomalies") or ())
+    if (state.get("cash") or {}).get("status") == "awaiting_review":
+        reasons.add("awaiting_review")
+    if commit.get("status") == "failed":
+        # cash_not_confirmed, or a PO that was never sent (tg_backpressure_drop)
+        reasons.update(commit.get("risk_flags") or ())
 
-    reason = candidates[0] if candidates else "low_confidence"
+    # only reasons we have a playbook for
+    reasons &= REASON_SET
+    reason = min(reasons, key=PRIORITY.__getitem__, default="low_confidence")
     sev, minutes, actions = REASONS.get(reason, ("med", 30, ["approve","deny"]))
     due = datetime.now(timezone.utc) + timedelta(minutes=minutes)
     return reason, actions, sev, due
@@ -53,12 +66,6 @@ async def ops_node(state):
     task_id = state.get("ops",{}).get("task_id") or str(uuid.uuid4())
     owner = "ops_team"  # TODO: implement pick_oncall round robin
 
-    # upsert the task
-    await state["dao"].upsert_ops_task({
-        "task_id": task_id, "order_id": state.get("order_id"),
-        "reason": reason, "severity": severity, "due_utc": due,
-        "actions": actions, "status": "open", "assigned_to": owner
-    })
     state["ops"] = {
         "task_id": task_id, "reason": reason, "severity": severity,
         "due_utc": due, "actions": actions, "status": "open",
@@ -70,33 +77,43 @@ async def ops_node(state):
     msg = f"OPS {severity.upper()} for order {state.get('order_id','n/a')} - {reason}"
     btns = [[{"text":"Approve","callback_data":f"ops:{task_id}:approve"}],
             [{"text":"Deny","callback_data":f"ops:{task_id}:deny"}]]
-    # add dynamic actions
+    # add dynamic actions, in the order the playbook lists them
     for a in actions:
-        if a.startswith("reroute:"):
-            target = a.split(":")[1]
+        kind, _, target = a.partition(":")
+        if kind == "reroute":
             btns.append([{"text":f"Reroute {target}", "callback_data":f"ops:{task_id}:reroute:{target}"}])
-        if a == "confirm_payment":
-            btns.append([{"text":"Confirm payment", "callback_data":f"ops:{task_id}:confirm_cash"}])
-    await state["telegram"].send_buttons(group, msg, btns)
+        elif a in ACTION_BUTTONS:
+            text, verb = ACTION_BUTTONS[a]
+            btns.append([{"text":text, "callback_data":f"ops:{task_id}:{verb}"}])
+
+    # upsert the task and notify in parallel; neither depends on the other
+    await asyncio.gather(
+        state["dao"].upsert_ops_task({
+            "task_id": task_id, "order_id": state.get("order_id"),
+            "reason": reason, "severity": severity, "due_utc": due,
+            "actions": actions, "status": "open", "assigned_to": owner
+        }),
+        state["telegram"].send_buttons(group, msg, btns),
+    )
     return state
 
 def ops_router(state):
     task = state.get("ops", {})
-    if task.get("status") in {"open","acked"}:
+    if task.get("status") in OPEN_STATUSES:
         return "Ops"  # loop until resolved
 
     # resolved with a specific resolution string
     res = task.get("resolution","")
-    if res.startswith("reroute:"):
-        target = res.split(":")[1]
-        return target
-    if res.startswith("approved"):
-        # continue the original happy path based on where we came from
-        if "cash_not_confirmed" in task.get("notes", []):
-            return "Cash"
-        if state.get("cluster"):
-            return "Supplier"
-        return "Learn"
-    if res.startswith("denied") or res.startswith("canceled"):
-        return "Clarify"
+    match res.partition(":"):
+        case ("reroute", ":", rest):
+            return rest.partition(":")[0]
+        case _ if res.startswith("approved"):
+            # continue the original happy path based on where we came from
+            if "cash_not_confirmed" in task.get("notes", []):
+                return "Cash"
+            if state.get("cluster"):
+                return "Supplier"
+            return "Learn"
+        case _ if res.startswith(("denied", "canceled")):
+            return "Clarify"
     return "Learn"
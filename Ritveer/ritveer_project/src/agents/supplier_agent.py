@@ -1,13 +1,17 @@
-import asyncio, time, uuid
+import asyncio, logging, time, uuid
 from pydantic import BaseModel
 from datetime import datetime, timedelta, timezone
 from typing import Optional
-from src.tools.messaging.telegram_client import TelegramClient
 from src.tools.dao import dao, tokens
 from src.tools.scoring import score_supplier_quote
 import httpx
+import numpy as np
 import os
 from src.tools.policy import policy
+from src.utils.telegram import get_telegram_client
+from src.utils.throttle import telegram_throttle
+
+logger = logging.getLogger(__name__)
 
 class RFPMeta(BaseModel):
     rfp_id: str
@@ -27,6 +31,7 @@ class Quote(BaseModel):
     status: str = "proposed"
 
 class SupplierOutput(BaseModel):
+    """Shape of state["supplier"]; supplier_node builds the dict directly"""
     rfp: RFPMeta
     quotes: list
     shortlist: list
@@ -34,13 +39,55 @@ class SupplierOutput(BaseModel):
     chosen_strategy: str
     risk_flags: list
 
-async def send_rfp_telegram(client, supplier, rfp, link):
+# Open RFPs in this process; a quote endpoint can wake the waiting
+# supplier_node through notify_quote_received. Until the quote ingest path
+# calls it, and for quotes that land on another worker, the DB is still
+# polled every RFP_POLL_S.
+rfp_events: dict[str, asyncio.Event] = {}
+RFP_POLL_S = 5
+
+def notify_quote_received(rfp_id: str) -> None:
+    """Call after a quote for rfp_id is stored so its waiter re-checks at once"""
+    ev = rfp_events.get(rfp_id)
+    if ev is not None:
+        ev.set()
+
+async def wait_for_quotes(rfp_id: str, deadline: datetime, needed: int) -> None:
+    """Returns once `needed` quotes are in for rfp_id or the deadline passes"""
+    ev = rfp_events.setdefault(rfp_id, asyncio.Event())
+    try:
+        while True:
+            remaining = (deadline - datetime.now(timezone.utc)).total_seconds()
+            if remaining <= 0:
+                return
+            try:
+                await asyncio.wait_for(ev.wait(), timeout=min(remaining, RFP_POLL_S))
+            except asyncio.TimeoutError:
+                pass
+            ev.clear()
+            if await dao.enough_quotes(rfp_id, needed):
+                return
+    finally:
+        rfp_events.pop(rfp_id, None)
+
+def rfp_message(rfp) -> tuple[str, list]:
+    """Text and Decline row shared by every invite for this RFP"""
     text = f"RFP {rfp['rfp_id']} for {rfp['cluster_label']} Qty {rfp['qty']} Due {rfp['deadline_utc']:%H:%M UTC}"
+    decline_row = [{"text": "Decline", "callback_data": f"decline:{rfp['rfp_id']}"}]
+    return text, decline_row
+
+async def send_rfp_telegram(client, supplier, text, link, decline_row) -> bool:
+    """Invites one supplier; False when the chat's send backlog is full and nothing was sent"""
+    # only the Quote now link differs per supplier
     buttons = [
         [{"text": "Quote now", "url": link}],
-        [{"text": "Decline", "callback_data": f"decline:{rfp['rfp_id']}"}]
+        decline_row
     ]
+    if not await telegram_throttle.wait(supplier["telegram_chat_id"]):
+        logger.warning("SUPPLIER AGENT: Telegram backlog full, supplier %s not invited", supplier["id"])
+        return False
     await client.send_buttons(supplier["telegram_chat_id"], text, buttons)
+    return True
 
 def score_quote(q, supplier_stats, policy):
     price_score = max(0.0, 1.0 - (q.amount_inr - policy["target_price"]) / max(1, policy["target_price"]))
@@ -56,8 +103,32 @@ def score_quote(q, supplier_stats, policy):
     if ot_rate > 0.95: reasons.append("reliable")
     return credibility, reasons
 
+def score_quotes(quotes, stats, policy):
+    """
+    score_quote over a whole quote set at once. `stats` is aligned with
+    `quotes`; returns the credibility array and each quote's reasons.
+    """
+    amount = np.fromiter((q.amount_inr for q in quotes), dtype=np.float64, count=len(quotes))
+    lead_time = np.fromiter((q.lead_time_days for q in quotes), dtype=np.float64, count=len(quotes))
+    ot_rate = np.fromiter((s.get("on_time_rate", 0.8) for s in stats), dtype=np.float64, count=len(stats))
+    qa = np.fromiter((s.get("qa_score", 0.8) for s in stats), dtype=np.float64, count=len(stats))
+    proximity = np.fromiter((s.get("km_to_customer", 500) for s in stats), dtype=np.float64, count=len(stats))
+
+    target_price, target_lead = policy["target_price"], policy["target_lead_time"]
+    price_score = np.maximum(0.0, 1.0 - (amount - target_price) / max(1, target_price))
+    speed_score = np.maximum(0.0, 1.0 - (lead_time - target_lead) / max(1, target_lead))
+    prox_score = np.maximum(0.0, 1.0 - proximity / 1000.0)
+    credibility = 0.35*price_score + 0.25*speed_score + 0.2*ot_rate + 0.15*qa + 0.05*prox_score
+
+    under_band, fast, reliable = price_score > 0.8, speed_score > 0.8, ot_rate > 0.95
+    reasons = [
+        [r for r, hit in (("under_band", under_band[i]), ("fast_lead_time", fast[i]), ("reliable", reliable[i])) if hit]
+        for i in range(len(quotes))
+    ]
+    return credibility, reasons
+
 async def supplier_node(state):
-    print("---SUPPLIER AGENT: RFP fan-out and collection---")
+    logger.debug("SUPPLIER AGENT: RFP fan-out and collection")
     cluster = state["cluster"]["primary"]
     intake = state["intake"]
     policy = state["policy"]
@@ -68,7 +139,7 @@ async def supplier_node(state):
 
     candidates = await dao.select_suppliers(cluster, limit=policy.get("invite_cap", 6))
 
-    client = TelegramClient()
+    client = get_telegram_client()
     links = {}
     for s in candidates:
         token = tokens.sign({"rfp_id": rfp_id, "supplier_id": s["id"], "exp": int(deadline.timestamp())})
@@ -80,37 +151,48 @@ async def supplier_node(state):
         "qty": intake.get("entities", {}).get("quantity", 1),
         "deadline_utc": deadline
     }
+    text, decline_row = rfp_message(rfp)
+
+    # Cap in-flight sends so a large invite list doesn't open a request per supplier at once
+    sem = asyncio.Semaphore(8)
+
+    async def _send(s):
+        async with sem:
+            return await send_rfp_telegram(client, s, text, links[s["id"]], decline_row)
 
-    await asyncio.gather(*[
-        send_rfp_telegram(client, s, rfp, links[s["id"]])
-        for s in candidates
-    ])
+    # Register before inviting so a fast quote can't arrive unobserved
+    rfp_events.setdefault(rfp_id, asyncio.Event())
+    sent = await asyncio.gather(*[_send(s) for s in candidates])
+    # Only suppliers whose invite went out are waited on
+    invited_ids = [c["id"] for c, ok in zip(candidates, sent) if ok]
 
-    # Wait window with polling
-    poll_every = 5
-    while datetime.now(timezone.utc) < deadline:
-        await asyncio.sleep(poll_every)
-        if await dao.enough_quotes(rfp_id, policy.get("shortlist_k", 3)):
-            break
+    # Wait window: woken by incoming quotes, with a slow poll as a backstop
+    await wait_for_quotes(rfp_id, deadline, policy.get("shortlist_k", 3))
 
     quotes_data = await dao.fetch_quotes(rfp_id)
     quotes = [Quote(**q, valid_till_utc=datetime.now(timezone.utc)+timedelta(hours=24)) for q in quotes_data]
 
     shortlist = []
     pol = {"target_price": cluster["price_band_inr"][1], "target_lead_time": cluster["lead_time_days"]}
-    for q in quotes:
-        stats = await dao.supplier_stats(q.supplier_id)
-        cred, reasons = score_quote(q.dict(), stats, pol)
-        q.credibility = round(cred, 3)
-        q.reasons = reasons
-        # Update quote in DB with credibility and reasons
-        await dao.insert_quote(q.rfp_id, q.supplier_id, q.amount_inr, q.lead_time_days, q.notes, round_no,
-                               q.credibility, q.reasons)
-        shortlist.append(q)
+    if quotes:
+        stats = await asyncio.gather(*[dao.supplier_stats(q.supplier_id) for q in quotes])
+        creds, reasons = score_quotes(quotes, stats, pol)
+        for q, cred, r in zip(quotes, creds.tolist(), reasons):
+            q.credibility = round(cred, 3)
+            q.reasons = r
+            shortlist.append(q)
+        # Update quotes in DB with credibility and reasons
+        await asyncio.gather(*[
+            dao.insert_quote(rfp_id, q.supplier_id, q.amount_inr, q.lead_time_days, q.notes, round_no,
+                             q.credibility, q.reasons)
+            for q in quotes
+        ])
     shortlist.sort(key=lambda x: x.credibility, reverse=True)
 
     fallback = None
     risk_flags = []
+    if len(invited_ids) < len(candidates):
+        risk_flags.append("tg_backpressure_drop")
     if not shortlist:
         hi = cluster["price_band_inr"][1]
         fallback = Quote(
@@ -123,20 +205,39 @@ async def supplier_node(state):
         )
         risk_flags.append("no_market_quotes")
 
-    state["supplier"] = SupplierOutput(
-        rfp=RFPMeta(rfp_id=rfp_id, round=round_no, deadline_utc=deadline, invited_supplier_ids=[c["id"] for c in candidates]),
-        quotes=quotes,
-        shortlist=shortlist[: policy.get("shortlist_k", 3)],
-        fallback_quote=fallback,
-        chosen_strategy="market" if shortlist else "fallback",
-        risk_flags=risk_flags
-    ).dict()
+    # Built directly in SupplierOutput's shape; each quote is serialized once
+    # and the shortlist reuses those dicts
+    quote_dicts = {id(q): q.dict() for q in quotes}
+    state["supplier"] = {
+        "rfp": {"rfp_id": rfp_id, "round": round_no, "deadline_utc": deadline,
+                "invited_supplier_ids": invited_ids},
+        "quotes": list(quote_dicts.values()),
+        "shortlist": [quote_dicts[id(q)] for q in shortlist[: policy.get("shortlist_k", 3)]],
+        "fallback_quote": fallback.dict() if fallback else None,
+        "chosen_strategy": "market" if shortlist else "fallback",
+        "risk_flags": risk_flags
+    }
     return state
 
-def supplier_agent_node(state):  # Sync wrapper for LangGraph, now discovery
-    asyncio.run(supplier_discovery_node(state))
+async def supplier_agent_node(state):  # LangGraph entry point, now discovery
+    await supplier_discovery_node(state)
     return state
 
+_discovery_http: httpx.AsyncClient | None = None
+
+def _discovery_client() -> httpx.AsyncClient:
+    """Shared client for the suppliers API, so keep-alive connections are reused"""
+    global _discovery_http
+    if _discovery_http is None:
+        _discovery_http = httpx.AsyncClient(timeout=10, limits=httpx.Limits(max_keepalive_connections=10))
+    return _discovery_http
+
+async def close_discovery_client() -> None:
+    global _discovery_http
+    if _discovery_http is not None:
+        await _discovery_http.aclose()
+        _discovery_http = None
+
 async def supplier_discovery_node(state: dict) -> dict:
     t0 = time.time()
     prof = state.get("profile", {})
@@ -146,13 +247,12 @@ async def supplier_discovery_node(state: dict) -> dict:
     k = policy.get().negotiation.shortlist_k
 
     API_BASE = os.getenv("API_BASE", "http://localhost:8000")
-    async with httpx.AsyncClient(timeout=10) as c:
-        try:
-            r = await c.get(f"{API_BASE}/suppliers/search", params={"material": material, "region": region, "k": k})
-            r.raise_for_status()
-            results = r.json().get("results", [])
-        except Exception:
-            results = []
+    try:
+        r = await _discovery_client().get(f"{API_BASE}/suppliers/search", params={"material": material, "region": region, "k": k})
+        r.raise_for_status()
+        results = r.json().get("results", [])
+    except Exception:
+        results = []
 
     state["suppliers"] = results
     out = "No suppliers found" if not results else "\n".join([f"- {s['name']} • {s['region']} • {s['band']} • rel {s['reliability']}" for s in results])
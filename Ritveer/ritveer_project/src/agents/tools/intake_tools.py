@@ -2,47 +2,160 @@
 Intake Agent Tools - Comprehensive toolset for processing customer requests
 """
 
+import os
 import re
 import json
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 import logging
+import functools
+import time
 from langchain_core.tools import tool
+try:
+    import re2
+except ImportError:  # optional; stdlib re is the fallback
+    re2 = None
+try:
+    import ahocorasick
+except ImportError:  # optional; per-keyword substring checks are the fallback
+    ahocorasick = None
 
 logger = logging.getLogger(__name__)
 
+# RE2 scans in linear time without backtracking; opt in per deployment
+INTAKE_RE2 = os.environ.get("RITVEER_INTAKE_RE2", "") == "1"
+
+# Patterns are compiled once at import, flags included
+PHONE_RES = (
+    re.compile(r'(\+91[\-\s]?)?[0]?(91)?[789]\d{9}'),  # Indian mobile
+    re.compile(r'(\+91[\-\s]?)?[0]?[1-9]\d{8,10}'),    # Indian landline
+)
+
+# (pattern, currency)
+AMOUNT_RES = (
+    (re.compile(r'₹\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE), "INR"),  # ₹ symbol
+    (re.compile(r'(?:rs|rupees?)\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE), "INR"),  # rs/rupees
+    (re.compile(r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*(?:rs|rupees?)', re.IGNORECASE), "INR"),  # number + rs/rupees
+    (re.compile(r'\$\s*(\d+(?:,\d{3})*(?:\.\d{2})?)', re.IGNORECASE), "USD"),  # Dollar
+)
+
+QUANTITY_RES = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'(\d+(?:\.\d+)?)\s*(kg|kilogram|kilograms)',
+    r'(\d+(?:\.\d+)?)\s*(g|gram|grams)',
+    r'(\d+(?:\.\d+)?)\s*(ton|tons|tonne|tonnes)',
+    r'(\d+(?:\.\d+)?)\s*(ltr|litre|litres|liter|liters)',
+    r'(\d+(?:\.\d+)?)\s*(pcs|pieces?|nos?|numbers?)',
+    r'(\d+(?:\.\d+)?)\s*(bags?|sacks?)',
+    r'(\d+(?:\.\d+)?)\s*(boxes?|cartons?)',
+))
+
+# Normalize units
+UNIT_MAPPING = {
+    'kilogram': 'kg', 'kilograms': 'kg',
+    'gram': 'g', 'grams': 'g',
+    'ton': 'tonne', 'tons': 'tonne', 'tonnes': 'tonne',
+    'litre': 'ltr', 'litres': 'ltr', 'liter': 'ltr', 'liters': 'ltr',
+    'pieces': 'pcs', 'piece': 'pcs', 'nos': 'pcs', 'numbers': 'pcs', 'number': 'pcs',
+    'bag': 'bags', 'sack': 'sacks',
+    'box': 'boxes', 'carton': 'cartons'
+}
+
+PINCODE_RE = re.compile(r'\b(\d{6})\b')
+
+# Every entity pattern above as one alternation, so a message is scanned
+# once. Alternative i is the named group e{i}; its own groups follow it,
+# so its value groups sit at fixed offsets from that group's index.
+_ENTITY_ALTS = (
+    [("phone", None, p) for p in PHONE_RES]
+    + [("amount", currency, p) for p, currency in AMOUNT_RES]
+    + [("quantity", None, p) for p in QUANTITY_RES]
+    + [("pincode", None, PINCODE_RE)]
+)
+# Case-insensitivity is inline so the same source compiles on either engine;
+# note RE2's \d and \b are ASCII-only
+_entity_engine = re2 if (INTAKE_RE2 and re2 is not None) else re
+ENTITY_RE = _entity_engine.compile(
+    "(?i)" + "|".join(f"(?P<e{i}>{p.pattern})" for i, (_, _, p) in enumerate(_ENTITY_ALTS))
+)
+# lastgroup -> (kind, currency, index of the alternative's outer group)
+_ENTITY_KINDS = {
+    f"e{i}": (kind, currency, ENTITY_RE.groupindex[f"e{i}"])
+    for i, (kind, currency, _) in enumerate(_ENTITY_ALTS)
+}
+
+# Scorer keyword sets; a score is the size of the set's intersection with
+# keyword_hits, so the sets are frozensets
+URGENT_KEYWORDS = frozenset({'urgent', 'asap', 'immediately', 'emergency', 'critical'})
+HIGH_KEYWORDS = frozenset({'soon', 'quickly', 'fast', 'priority'})
+MEDIUM_KEYWORDS = frozenset({'within', 'by', 'before'})
+SPAM_INDICATORS = frozenset({
+    'click here', 'free money', 'lottery', 'winner', 'congratulations',
+    'claim now', 'limited time', 'act now', 'urgent response required'
+})
+BUSINESS_INDICATORS = frozenset({
+    'need', 'want', 'buy', 'purchase', 'sell', 'supply', 'require',
+    'quote', 'price', 'cost', 'bulk', 'wholesale', 'quantity'
+})
+BUY_KEYWORDS = frozenset({'buy', 'purchase', 'need', 'want', 'require', 'looking for'})
+SELL_KEYWORDS = frozenset({'sell', 'selling', 'available', 'supply', 'offer'})
+INQUIRY_KEYWORDS = frozenset({'price', 'cost', 'quote', 'information', 'details'})
+PRODUCT_CATEGORIES = {
+    "raw_materials": ("clay", "sand", "cement", "steel", "iron", "wood", "plastic"),
+    "textiles": ("fabric", "cloth", "yarn", "thread", "cotton", "silk", "wool"),
+    "electronics": ("mobile", "phone", "computer", "laptop", "cable", "wire"),
+    "food_items": ("rice", "wheat", "oil", "spices", "grain", "flour"),
+    "chemicals": ("acid", "chemical", "solvent", "paint", "dye"),
+    "machinery": ("machine", "equipment", "tool", "motor", "pump"),
+}
+# Common Indian city patterns
+INDIAN_CITIES = (
+    'mumbai', 'delhi', 'bangalore', 'hyderabad', 'chennai', 'kolkata',
+    'pune', 'ahmedabad', 'jaipur', 'surat', 'lucknow', 'kanpur',
+    'nagpur', 'indore', 'thane', 'bhopal', 'visakhapatnam', 'pimpri',
+    'patna', 'vadodara', 'ghaziabad', 'ludhiana', 'agra', 'nashik'
+)
+
+ALL_KEYWORDS = frozenset().union(
+    URGENT_KEYWORDS, HIGH_KEYWORDS, MEDIUM_KEYWORDS, SPAM_INDICATORS, BUSINESS_INDICATORS,
+    BUY_KEYWORDS, SELL_KEYWORDS, INQUIRY_KEYWORDS, INDIAN_CITIES,
+    *PRODUCT_CATEGORIES.values()
+)
+
+def _build_keyword_automaton():
+    automaton = ahocorasick.Automaton()
+    for kw in ALL_KEYWORDS:
+        automaton.add_word(kw, kw)
+    automaton.make_automaton()
+    return automaton
+
+_KEYWORD_AC = _build_keyword_automaton() if ahocorasick is not None else None
+
+def keyword_hits(text_lower: str) -> frozenset:
+    """
+    Every keyword above that occurs in text_lower as a substring, found in
+    one Aho-Corasick pass when pyahocorasick is installed. The scorers
+    below test membership in this set instead of scanning the text.
+    """
+    if _KEYWORD_AC is not None:
+        return frozenset(kw for _, kw in _KEYWORD_AC.iter(text_lower))
+    return frozenset(kw for kw in ALL_KEYWORDS if kw in text_lower)
+
 class TextProcessingTools:
     """Text processing utilities for intake agent."""
     
     @staticmethod
     def extract_phone_numbers(text: str) -> List[str]:
         """Extract phone numbers from text."""
-        patterns = [
-            r'(\+91[\-\s]?)?[0]?(91)?[789]\d{9}',  # Indian mobile
-            r'(\+91[\-\s]?)?[0]?[1-9]\d{8,10}',    # Indian landline
-        ]
-        
-        phones = []
-        for pattern in patterns:
-            phones.extend(re.findall(pattern, text))
-        
-        return list(set([phone.strip() for phone in phones if phone.strip()]))
+        # group(0): findall would return the optional prefix groups, not the number
+        phones = [m.group(0).strip() for pattern in PHONE_RES for m in pattern.finditer(text)]
+        return list(set([phone for phone in phones if phone]))
     
     @staticmethod
     def extract_amounts(text: str) -> List[Dict[str, Any]]:
         """Extract monetary amounts from text."""
-        patterns = [
-            r'₹\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',  # ₹ symbol
-            r'(?:rs|rupees?)\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',  # rs/rupees
-            r'(\d+(?:,\d{3})*(?:\.\d{2})?)\s*(?:rs|rupees?)',  # number + rs/rupees
-            r'\$\s*(\d+(?:,\d{3})*(?:\.\d{2})?)',  # Dollar
-        ]
-        
         amounts = []
-        for i, pattern in enumerate(patterns):
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                currency = "INR" if i < 3 else "USD"
+        for pattern, currency in AMOUNT_RES:
+            for match in pattern.finditer(text):
                 amount_str = match.group(1)
                 amount = float(amount_str.replace(',', ''))
                 
@@ -57,35 +170,12 @@ class TextProcessingTools:
     @staticmethod
     def extract_quantities(text: str) -> List[Dict[str, Any]]:
         """Extract quantities with units from text."""
-        patterns = [
-            r'(\d+(?:\.\d+)?)\s*(kg|kilogram|kilograms)',
-            r'(\d+(?:\.\d+)?)\s*(g|gram|grams)',
-            r'(\d+(?:\.\d+)?)\s*(ton|tons|tonne|tonnes)',
-            r'(\d+(?:\.\d+)?)\s*(ltr|litre|litres|liter|liters)',
-            r'(\d+(?:\.\d+)?)\s*(pcs|pieces?|nos?|numbers?)',
-            r'(\d+(?:\.\d+)?)\s*(bags?|sacks?)',
-            r'(\d+(?:\.\d+)?)\s*(boxes?|cartons?)',
-        ]
-        
         quantities = []
-        for pattern in patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
+        for pattern in QUANTITY_RES:
+            for match in pattern.finditer(text):
                 quantity = float(match.group(1))
                 unit = match.group(2).lower()
-                
-                # Normalize units
-                unit_mapping = {
-                    'kilogram': 'kg', 'kilograms': 'kg',
-                    'gram': 'g', 'grams': 'g',
-                    'ton': 'tonne', 'tons': 'tonne', 'tonnes': 'tonne',
-                    'litre': 'ltr', 'litres': 'ltr', 'liter': 'ltr', 'liters': 'ltr',
-                    'pieces': 'pcs', 'piece': 'pcs', 'nos': 'pcs', 'numbers': 'pcs', 'number': 'pcs',
-                    'bag': 'bags', 'sack': 'sacks',
-                    'box': 'boxes', 'carton': 'cartons'
-                }
-                
-                normalized_unit = unit_mapping.get(unit, unit)
+                normalized_unit = UNIT_MAPPING.get(unit, unit)
                 
                 quantities.append({
                     "value": quantity,
@@ -96,24 +186,49 @@ class TextProcessingTools:
         return quantities
     
     @staticmethod
-    def extract_locations(text: str) -> List[Dict[str, Any]]:
-        """Extract location information from text."""
-        pincode_pattern = r'\b(\d{6})\b'
-        pincodes = re.findall(pincode_pattern, text)
-        
-        # Common Indian city patterns
-        indian_cities = [
-            'mumbai', 'delhi', 'bangalore', 'hyderabad', 'chennai', 'kolkata',
-            'pune', 'ahmedabad', 'jaipur', 'surat', 'lucknow', 'kanpur',
-            'nagpur', 'indore', 'thane', 'bhopal', 'visakhapatnam', 'pimpri',
-            'patna', 'vadodara', 'ghaziabad', 'ludhiana', 'agra', 'nashik'
-        ]
+    def scan_entities(text: str) -> Dict[str, list]:
+        """
+        Phones, amounts, quantities and pincodes from a single pass of
+        ENTITY_RE. Matches are leftmost and non-overlapping across all
+        kinds, and each list is in text order (phones deduplicated, first
+        occurrence kept). Amounts and quantities come
+        back as parallel columns rather than one dict per match.
+        """
+        phones, pincodes = {}, []  # phones as an insertion-ordered set
+        amounts = {"values": [], "currencies": [], "raw_text": []}
+        quantities = {"values": [], "units": [], "raw_text": []}
+        for match in ENTITY_RE.finditer(text):
+            kind, currency, g = _ENTITY_KINDS[match.lastgroup]
+            if kind == "phone":
+                phone = match.group(g).strip()
+                if phone:
+                    phones[phone] = None
+            elif kind == "amount":
+                amounts["values"].append(float(match.group(g + 1).replace(',', '')))
+                amounts["currencies"].append(currency)
+                amounts["raw_text"].append(match.group(g))
+            elif kind == "quantity":
+                unit = match.group(g + 2).lower()
+                quantities["values"].append(float(match.group(g + 1)))
+                quantities["units"].append(UNIT_MAPPING.get(unit, unit))
+                quantities["raw_text"].append(match.group(g))
+            else:
+                pincodes.append(match.group(g + 1))
+        return {"phones": list(phones), "amounts": amounts, "quantities": quantities, "pincodes": pincodes}
+
+    @staticmethod
+    def extract_locations(text: str, pincodes: Optional[List[str]] = None,
+                          hits: Optional[frozenset] = None) -> List[Dict[str, Any]]:
+        """Extract location information from text; pass pincodes and keyword_hits if already scanned."""
+        if pincodes is None:
+            pincodes = PINCODE_RE.findall(text)
+        if hits is None:
+            hits = keyword_hits(text.lower())
         
         locations = []
-        text_lower = text.lower()
         
-        for city in indian_cities:
-            if city in text_lower:
+        for city in INDIAN_CITIES:
+            if city in hits:
                 locations.append({
                     "type": "city",
                     "value": city.title(),
@@ -128,21 +243,28 @@ class TextProcessingTools:
             })
         
         return locations
+
+    @staticmethod
+    def location_columns(pincodes: List[str], hits: frozenset) -> Dict[str, list]:
+        """extract_locations as parallel types/values/confidence columns"""
+        cities = [city.title() for city in INDIAN_CITIES if city in hits]
+        return {
+            "types": ["city"] * len(cities) + ["pincode"] * len(pincodes),
+            "values": cities + pincodes,
+            "confidence": [0.8] * len(cities) + [0.9] * len(pincodes),
+        }
     
     @staticmethod
-    def detect_urgency(text: str) -> str:
-        """Detect urgency level from text."""
-        urgent_keywords = ['urgent', 'asap', 'immediately', 'emergency', 'critical']
-        high_keywords = ['soon', 'quickly', 'fast', 'priority']
-        medium_keywords = ['within', 'by', 'before']
+    def detect_urgency(text: str, hits: Optional[frozenset] = None) -> str:
+        """Detect urgency level from text; pass keyword_hits if already computed."""
+        if hits is None:
+            hits = keyword_hits(text.lower())
         
-        text_lower = text.lower()
-        
-        if any(keyword in text_lower for keyword in urgent_keywords):
+        if not hits.isdisjoint(URGENT_KEYWORDS):
             return "urgent"
-        elif any(keyword in text_lower for keyword in high_keywords):
+        elif not hits.isdisjoint(HIGH_KEYWORDS):
             return "high"
-        elif any(keyword in text_lower for keyword in medium_keywords):
+        elif not hits.isdisjoint(MEDIUM_KEYWORDS):
             return "medium"
         else:
             return "low"
@@ -151,25 +273,16 @@ class ValidationTools:
     """Validation utilities for intake processing."""
     
     @staticmethod
-    def validate_business_inquiry(text: str) -> Dict[str, Any]:
+    def validate_business_inquiry(text: str, hits: Optional[frozenset] = None) -> Dict[str, Any]:
         """Validate if the text is a legitimate business inquiry."""
-        spam_indicators = [
-            'click here', 'free money', 'lottery', 'winner', 'congratulations',
-            'claim now', 'limited time', 'act now', 'urgent response required'
-        ]
-        
-        business_indicators = [
-            'need', 'want', 'buy', 'purchase', 'sell', 'supply', 'require',
-            'quote', 'price', 'cost', 'bulk', 'wholesale', 'quantity'
-        ]
-        
-        text_lower = text.lower()
+        if hits is None:
+            hits = keyword_hits(text.lower())
         
-        spam_score = sum(1 for indicator in spam_indicators if indicator in text_lower)
-        business_score = sum(1 for indicator in business_indicators if indicator in text_lower)
+        spam_score = len(hits & SPAM_INDICATORS)
+        business_score = len(hits & BUSINESS_INDICATORS)
         
         is_valid = business_score > spam_score and len(text.split()) > 3
-        confidence = min((business_score / max(len(business_indicators), 1)) * 0.8 + 0.2, 1.0)
+        confidence = min((business_score / max(len(BUSINESS_INDICATORS), 1)) * 0.8 + 0.2, 1.0)
         
         return {
             "is_valid": is_valid,
@@ -180,17 +293,14 @@ class ValidationTools:
         }
     
     @staticmethod
-    def classify_intent(text: str) -> str:
+    def classify_intent(text: str, hits: Optional[frozenset] = None) -> str:
         """Classify the intent of the message."""
-        buy_keywords = ['buy', 'purchase', 'need', 'want', 'require', 'looking for']
-        sell_keywords = ['sell', 'selling', 'available', 'supply', 'offer']
-        inquiry_keywords = ['price', 'cost', 'quote', 'information', 'details']
+        if hits is None:
+            hits = keyword_hits(text.lower())
         
-        text_lower = text.lower()
-        
-        buy_score = sum(1 for keyword in buy_keywords if keyword in text_lower)
-        sell_score = sum(1 for keyword in sell_keywords if keyword in text_lower)
-        inquiry_score = sum(1 for keyword in inquiry_keywords if keyword in text_lower)
+        buy_score = len(hits & BUY_KEYWORDS)
+        sell_score = len(hits & SELL_KEYWORDS)
+        inquiry_score = len(hits & INQUIRY_KEYWORDS)
         
         max_score = max(buy_score, sell_score, inquiry_score)
         
@@ -203,44 +313,71 @@ class ValidationTools:
         else:
             return "inquire"
 
-# LangChain Tools
-@tool
-def extract_structured_data(text: str) -> Dict[str, Any]:
-    """Extract structured data from customer message."""
+@functools.lru_cache(maxsize=4096)
+def _extract_impl(text: str) -> Dict[str, Any]:
+    # Pure in text, so retries and replays of a message reuse the result
     processor = TextProcessingTools()
     validator = ValidationTools()
+    entities = processor.scan_entities(text)
+    # one lowercase and one keyword pass feed cities, urgency, validation and intent
+    hits = keyword_hits(text.lower())
     
     return {
-        "phones": processor.extract_phone_numbers(text),
-        "amounts": processor.extract_amounts(text),
-        "quantities": processor.extract_quantities(text),
-        "locations": processor.extract_locations(text),
-        "urgency": processor.detect_urgency(text),
-        "validation": validator.validate_business_inquiry(text),
-        "intent": validator.classify_intent(text),
-        "timestamp": datetime.now().isoformat()
+        "phones": entities["phones"],
+        "amounts": entities["amounts"],
+        "quantities": entities["quantities"],
+        "locations": processor.location_columns(entities["pincodes"], hits),
+        "urgency": processor.detect_urgency(text, hits),
+        "validation": validator.validate_business_inquiry(text, hits),
+        "intent": validator.classify_intent(text, hits),
+    }
+
+def _columns_copy(columns: Dict[str, list]) -> Dict[str, list]:
+    return {k: list(v) for k, v in columns.items()}
+
+# (epoch second, its ISO string); the timestamp is formatted once per second
+_ts_cache = [0, ""]
+
+def _now_iso() -> str:
+    t = int(time.time())
+    if _ts_cache[0] != t:
+        _ts_cache[1] = datetime.fromtimestamp(t).isoformat()
+        _ts_cache[0] = t
+    return _ts_cache[1]
+
+# LangChain Tools
+@tool
+def extract_structured_data(text: str) -> Dict[str, Any]:
+    """Extract structured data from customer message.
+
+    amounts, quantities and locations are column dicts: parallel lists
+    such as {"values": [...], "currencies": [...], "raw_text": [...]}.
+    """
+    cached = _extract_impl(text)
+    # Fresh containers, so a caller editing its result can't corrupt the
+    # cached extraction; the leaves are immutable scalars and strings
+    return {
+        **cached,
+        "phones": list(cached["phones"]),
+        "amounts": _columns_copy(cached["amounts"]),
+        "quantities": _columns_copy(cached["quantities"]),
+        "locations": _columns_copy(cached["locations"]),
+        "validation": dict(cached["validation"]),
+        "timestamp": _now_iso(),
     }
 
 @tool
 def categorize_product(product_name: str, description: str = "") -> Dict[str, Any]:
     """Categorize product based on name and description."""
-    categories = {
-        "raw_materials": ["clay", "sand", "cement", "steel", "iron", "wood", "plastic"],
-        "textiles": ["fabric", "cloth", "yarn", "thread", "cotton", "silk", "wool"],
-        "electronics": ["mobile", "phone", "computer", "laptop", "cable", "wire"],
-        "food_items": ["rice", "wheat", "oil", "spices", "grain", "flour"],
-        "chemicals": ["acid", "chemical", "solvent", "paint", "dye"],
-        "machinery": ["machine", "equipment", "tool", "motor", "pump"]
-    }
-    
-    text = f"{product_name} {description}".lower()
+    hits = keyword_hits(f"{product_name} {description}".lower())
     
-    for category, keywords in categories.items():
-        if any(keyword in text for keyword in keywords):
+    for category, keywords in PRODUCT_CATEGORIES.items():
+        matched = [kw for kw in keywords if kw in hits]
+        if matched:
             return {
                 "category": category,
                 "confidence": 0.8,
-                "keywords_matched": [kw for kw in keywords if kw in text]
+                "keywords_matched": matched
             }
     
     return {
@@ -1,59 +1,101 @@
-from fastapi import APIRouter, Request, HTTPException, Depends, Form
+from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi.responses import JSONResponse
 from twilio.request_validator import RequestValidator
-import hmac, hashlib, base64, os, redis
-from typing import Dict, Optional
+import asyncio, hmac, base64, os, redis, functools, logging
+from urllib.parse import parse_qsl
 
 from ritveer_project.src.graph.state import RitveerState
+from ritveer_project.src.agents.intake_agent import make_request_id
+from src.utils.redis_utils import get_async_redis
+
+logger = logging.getLogger(__name__)
 
 # Initialize Redis client
 # In a real application, this would be configured more robustly,
 # e.g., using a connection pool or dependency injection.
 try:
     r = redis.Redis.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
-except Exception as e:
-    print(f"Could not connect to Redis: {e}. Proceeding without Redis for now.")
+except Exception:
+    logger.warning("Could not connect to Redis; proceeding without it", exc_info=True)
     r = None # Set r to None if connection fails
 
 router = APIRouter()
 
-def make_request_id(msg_sid: str, body: str) -> str:
-    """
-    Generates a unique request ID from Twilio MessageSid and HMAC of the body.
-    """
-    digest = hashlib.sha256(body.encode('utf-8')).hexdigest()[:16]
-    return f"{msg_sid}-{digest}"
+@functools.lru_cache(maxsize=4)
+def _request_validator(auth_token: str) -> RequestValidator:
+    return RequestValidator(auth_token)
+
+# Graph runs started by the webhook; holding a reference keeps them from
+# being garbage collected before they finish
+_graph_runs: set[asyncio.Task] = set()
+NEXT_HINT_TTL_S = 3600
+# Twilio redelivers the same MessageSid for up to a day on flaky networks
+DEDUPE_TTL_S = 24 * 3600
+
+async def _run_graph(workflow, initial_state: RitveerState, request_id: str) -> None:
+    try:
+        # thread_id keys checkpoints when the workflow has a checkpointer
+        result = await workflow.ainvoke(initial_state, config={"configurable": {"thread_id": request_id}})
+    except Exception:
+        # Nothing awaits this task, so the traceback is only kept if logged here
+        logger.exception("Graph run failed for request %s", request_id)
+        return
+
+    # Extract next_actions_hint from the final state of the intake agent
+    final_intake_output = result.get("intake")
+    next_action = final_intake_output.get("next_actions_hint") if final_intake_output else "unknown"
+    # Published for anything polling on the request id
+    if r:
+        try:
+            await asyncio.to_thread(r.set, f"intake:next:{request_id}", next_action or "unknown", ex=NEXT_HINT_TTL_S)
+        except redis.RedisError as e:
+            logger.warning("Could not store next action for %s: %s", request_id, e)
 
 @router.post("/hooks/whatsapp")
-async def whatsapp_hook(request: Request, 
-                        MessageSid: Optional[str] = Form(None),
-                        Body: Optional[str] = Form(None),
-                        **kwargs):
+async def whatsapp_hook(request: Request):
     
+    # Twilio posts application/x-www-form-urlencoded; the body is read and
+    # parsed once and serves both the fields and the signature check
     raw_body = await request.body()
+    try:
+        form_params = dict(parse_qsl(raw_body.decode("utf-8"), keep_blank_values=True))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail={"error": "invalid_encoding"})
+    MessageSid = form_params.get("MessageSid")
+    Body = form_params.get("Body")
     url = str(request.url)
     signature = request.headers.get("X-Twilio-Signature", "")
     twilio_auth_token = os.environ.get("TWILIO_AUTH_TOKEN")
 
     if not twilio_auth_token:
-        print("TWILIO_AUTH_TOKEN not set. Skipping signature validation.")
+        logger.warning("TWILIO_AUTH_TOKEN not set. Skipping signature validation.")
         valid_signature = False # Treat as invalid if token is missing
     else:
-        validator = RequestValidator(twilio_auth_token)
+        validator = _request_validator(twilio_auth_token)
         # Twilio validator expects a dict of form parameters
-        form_params = {k: v for k, v in request._form.items()} if request._form else {}
         valid_signature = validator.validate(url, form_params, signature)
 
     msg_sid = MessageSid or "unknown"
     request_id = make_request_id(msg_sid, Body or "")
 
     # --- De-dupe and Rate Limit ---
-    if r:
-        if not r.setnx(f"intake:seen:{request_id}", 1):
-            print(f"Duplicate request detected: {request_id}")
-            return {"status": "duplicate", "request_id": request_id}
-        r.expire(f"intake:seen:{request_id}", 120) # Expire after 2 minutes
+    # Keyed on the MessageSid, so a redelivery is dropped before any graph
+    # work; the content id stands in when Twilio didn't send one. Only a
+    # signed request may claim a MessageSid; unsigned ones are de-duped in
+    # their own namespace so a forged request can't shadow a real message.
+    # SET NX EX claims the key and its expiry in one atomic command
+    if valid_signature:
+        seen_key = f"intake:seen:{MessageSid or request_id}"
     else:
-        print("Redis not connected. Skipping de-duplication.")
+        seen_key = f"intake:seen:unsigned:{request_id}"
+    try:
+        first_seen = await get_async_redis().set(seen_key, 1, nx=True, ex=DEDUPE_TTL_S)
+    except redis.RedisError as e:
+        logger.warning("Redis unavailable (%s). Skipping de-duplication.", e)
+        first_seen = True
+    if not first_seen:
+        logger.info("Duplicate request detected: %s", request_id)
+        return {"status": "duplicate", "request_id": request_id}
 
     # Prepare initial state for the graph
     initial_state: RitveerState = {
@@ -77,17 +119,16 @@ async def whatsapp_hook(request: Request,
     }
 
     if not valid_signature:
-        print(f"Invalid Twilio signature for request: {request_id}")
+        logger.warning("Invalid Twilio signature for request: %s", request_id)
         initial_state["intake"]["risk_flags"].append("invalid_signature")
         initial_state["intake"]["next_actions_hint"] = "guard_agent" # Hint for router
 
-    # Kick the graph
+    # Kick the graph in the background and acknowledge Twilio right away;
+    # agents reply on the chat channel as they finish
     # The graph expects a dictionary, not a Pydantic model for initial state
     # The intake_node will then populate the 'intake' key with IntakeOutput
-    result = await request.app.state.workflow.ainvoke(initial_state)
-    
-    # Extract next_actions_hint from the final state of the intake agent
-    final_intake_output = result.get("intake")
-    next_action = final_intake_output.get("next_actions_hint") if final_intake_output else "unknown"
+    task = asyncio.create_task(_run_graph(request.app.state.workflow, initial_state, request_id))
+    _graph_runs.add(task)
+    task.add_done_callback(_graph_runs.discard)
 
-    return {"status": "ok", "request_id": request_id, "next": next_action}
+    return JSONResponse({"status": "queued", "request_id": request_id}, status_code=202)
@@ -1,3 +1,9 @@
-from .settings import settings
+from .settings import get_settings
 
-__all__ = ["settings"]
+__all__ = ["settings", "get_settings"]
+
+
+def __getattr__(name: str):
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
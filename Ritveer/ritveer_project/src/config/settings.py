@@ -4,10 +4,34 @@ from pydantic import BaseSettings
 class Settings(BaseSettings):
     """Application configuration loaded from environment variables."""
     GOOGLE_MAPS_API_KEY: str | None = None
+    LOG_FILE_PATH: str = "logs/ritveer.log"
+    # Browser origins allowed by CORS; none unless configured. Deployments set
+    # the exact list, e.g. ALLOWED_ORIGINS='["https://app.ritveer.in"]', and
+    # local development opts into '["*"]' through .env
+    ALLOWED_ORIGINS: list[str] = []
+    # Approximate cap on entries kept in the Redis retry stream
+    RETRY_STREAM_MAXLEN: int = 100_000
 
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
-settings = Settings()
+_settings: Settings | None = None
+
+
+def get_settings() -> Settings:
+    """Return the process-wide Settings, reading the environment on first use."""
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+    return _settings
+
+
+def __getattr__(name: str):
+    # Compatibility alias for `config.settings.settings`. A
+    # `from config.settings import settings` resolves it, and so builds
+    # Settings, at import time; modules call get_settings() where they use it.
+    if name == "settings":
+        return get_settings()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
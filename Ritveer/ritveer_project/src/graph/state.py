@@ -32,11 +32,13 @@ class ClusterCandidate(BaseModel):
     location_hint: dict              # {"lat":..., "lon":..., "radius_km":...}
     risk_flags: List[str]            # e.g. ["low_coverage","quality_decline"]
 
+ChosenStrategy = Literal["exact","nearest","nearest_with_flags","fallback","rules_only","skipped"]
+
 class ClusterOutput(BaseModel):
     primary: Optional[ClusterCandidate]
     alternates: List[ClusterCandidate] = []
     disambiguation_keys: List[str] = []   # which missing slots matter most
-    chosen_strategy: Literal["exact","nearest","fallback","rules_only", "skipped"]
+    chosen_strategy: ChosenStrategy
     metrics: Dict[str, float] = {}        # latency, neighbors_scanned, etc
 
 
@@ -66,14 +68,6 @@ class RitveerState(TypedDict, total=False):
     - `error`: Any error message that occurred during the execution.
     - `return_direct_response`: A flag to indicate if the agent should return a direct response.
     - `final_answer`: The final answer to the user's query.
-
-    # --- Legacy FIELDS --- #
-    intake: IntakeOutput
-    cluster: ClusterOutput
-    artisan_clusters: Optional[List[dict[str, Any]]]
-    supplier_quotes: Optional[List[dict[str, Any]]]
-    final_order: Optional[dict[str, Any]]
-    shipping_label_url: Optional[str]
     """
     # Shared state contract
     messages: List[dict[str, Any]]  # transcript
@@ -100,6 +94,7 @@ class RitveerState(TypedDict, total=False):
 
     # --- Legacy FIELDS --- #
     intake: IntakeOutput
+    intake_route: str  # next node, decided by intake_node
     cluster: ClusterOutput
     artisan_clusters: Optional[List[dict[str, Any]]]
     supplier_quotes: Optional[List[dict[str, Any]]]
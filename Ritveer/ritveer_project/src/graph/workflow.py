@@ -1,8 +1,24 @@
+import logging
 from langgraph.graph import StateGraph, END
 from typing import Dict, Any
 from pydantic import BaseModel
 from datetime import datetime
 from src.tools.policy import policy as policy_store
+from src.graph.state import IntakeOutput
+
+# policy_store.dict() re-serializes the model, so one dump is shared by
+# every request until /policy/reload swaps the policy. Nodes only read it
+_policy_snapshot: Dict[str, Any] | None = None
+
+def current_policy() -> Dict[str, Any]:
+    global _policy_snapshot
+    if _policy_snapshot is None:
+        _policy_snapshot = policy_store.dict()
+    return _policy_snapshot
+
+def invalidate_policy() -> None:
+    global _policy_snapshot
+    _policy_snapshot = None
 
 # Initialize state with contract
 def initialize_state(**kwargs) -> Dict[str, Any]:
@@ -15,7 +31,7 @@ def initialize_state(**kwargs) -> Dict[str, Any]:
         "quote": {},
         "events": [],
         "artifacts": {},
-        "policy": policy_store.dict(),
+        "policy": current_policy(),
         "agents": {},
     }
     state.update(kwargs)
@@ -37,6 +53,8 @@ from src.agents.learn_agent import learn_node
 from src.agents.sales_agent import sales_agent_node
 from src.agents.translate_agent import translate_agent_node
 
+logger = logging.getLogger(__name__)
+
 
 # Initialize the StateGraph with our RitveerState schema
 workflow = StateGraph(RitveerState)
@@ -46,8 +64,8 @@ workflow = StateGraph(RitveerState)
 # reasoning_llm = ChatOllama(model="gemma3:4b", base_url=settings.OLLAMA_HOST)
 
 # --- Intake Node and Router ---
-def intake_node(state: RitveerState) -> RitveerState:
-    print("Executing Intake Node...")
+async def intake_node(state: RitveerState) -> RitveerState:
+    logger.debug("Executing Intake Node...")
     # Assuming raw_message and channel are passed in the initial state
     # from the webhook.
     raw_message = state.get("raw_message", "")
@@ -55,38 +73,46 @@ def intake_node(state: RitveerState) -> RitveerState:
     
     # Pass any other relevant info from state to run_intake_pipeline
     # For now, we'll assume the webhook populates raw_message and channel
-    # and the intake pipeline handles the rest.
-    
-    intake_output = run_intake_pipeline(raw_message=raw_message, channel=channel)
+    # and the intake pipeline handles the rest. Flags the webhook raised
+    # (e.g. invalid_signature) are carried over, since the dump below
+    # replaces its intake dict.
+    upstream_flags = (state.get("intake") or {}).get("risk_flags")
+    intake_output = await run_intake_pipeline(raw_message=raw_message, channel=channel,
+                                              upstream_risk_flags=upstream_flags)
     state["intake"] = intake_output.model_dump()
+    # Decided here, off the typed model, so the router doesn't walk the dump
+    state["intake_route"] = route_intake(intake_output)
     return state
 
-def intake_router(state: RitveerState) -> str:
-    print("Executing Intake Router...")
-    intake_output = state.get("agents", {}).get("intake", {}).get("output")
-    if not intake_output:
-        return "Ops" # Fallback if intake data is missing
-
-    flags = set(intake_output.get("risk_flags", []))
-    if "invalid_signature" in flags or "spam" in flags or "blacklist_hit" in flags:
-        print("---ROUTER: Routing to Guard Agent (Risk Flags)---")
+# Intake risk flags that send a request to Guard first
+GUARD_FLAGS = frozenset({"invalid_signature", "spam", "blacklist_hit"})
+SUPPORTED_LANGUAGES = frozenset({"en", "hi"})  # Assuming "en", "hi" are supported directly
+
+def route_intake(intake: IntakeOutput) -> str:
+    """Next node after Intake for a finished IntakeOutput"""
+    if not GUARD_FLAGS.isdisjoint(intake.risk_flags):
+        logger.debug("router %s -> %s (%s)", "intake", "Guard", "risk flags")
         return "Guard"
-    if intake_output.get("meta", {}).get("duplicate") == "true":
-        print("---ROUTER: Routing to END (Duplicate)---")
+    if intake.meta.get("duplicate") == "true":
+        logger.debug("router %s -> %s (%s)", "intake", "drop", "duplicate")
         return "drop"
-    if intake_output.get("intent") == "unsupported":
-        print("---ROUTER: Routing to Ops Agent (Unsupported Intent)---")
+    if intake.intent == "unsupported":
+        logger.debug("router %s -> %s (%s)", "intake", "Ops", "unsupported intent")
         return "Ops"
-    if intake_output.get("slot_gaps"):
-        print("---ROUTER: Routing to Clarify Agent (Slot Gaps)---")
+    if intake.slot_gaps:
+        logger.debug("router %s -> %s (%s)", "intake", "Clarify", "slot gaps")
         return "Clarify"
-    if intake_output.get("language") not in {"en","hi"}: # Assuming "en", "hi" are supported directly
-        print("---ROUTER: Routing to Translate Agent (Unsupported Language)---")
+    if intake.language not in SUPPORTED_LANGUAGES:
+        logger.debug("router %s -> %s (%s)", "intake", "Translate", "unsupported language")
         return "Translate"
 
-    print("---ROUTER: Routing to Cluster Agent (Happy Path)---")
+    logger.debug("router %s -> %s (%s)", "intake", "Cluster", "happy path")
     return "Cluster"
 
+def intake_router(state: RitveerState) -> str:
+    # Fallback to Ops if intake didn't run to completion
+    return state.get("intake_route") or "Ops"
+
 # Add Nodes to Graph
 workflow.add_node("Intake", intake_node)
 workflow.add_node("Guard", guard_node)
@@ -111,10 +137,10 @@ def route_to_sales(state: RitveerState) -> str:
     # or will be derived from intake.
     normalized_request = state.get("normalized_request", {})
     if normalized_request.get("sales_task"):
-        print("---ROUTER: Routing to SalesAgent---")
+        logger.debug("router %s -> %s", "sales", "Sales")
         return "Sales"
     else:
-        print("---ROUTER: Routing to CashAgent---")
+        logger.debug("router %s -> %s", "sales", "Cash")
         return "Cash"
 
 # Define Conditional Edge for Cluster Agent
@@ -124,10 +150,10 @@ def route_after_cluster(state: RitveerState) -> str:
     """
     clustered_suppliers = state.get("clustered_suppliers", [])
     if not clustered_suppliers:
-        print("---ROUTER: No clustered suppliers found. Routing to CommitAgent.---")
+        logger.debug("router %s -> %s (%s)", "cluster", "Commit", "no clustered suppliers")
         return "Commit"
     else:
-        print("---ROUTER: Clustered suppliers found. Routing to SupplierAgent.---")
+        logger.debug("router %s -> %s (%s)", "cluster", "Supplier", "clustered suppliers")
         return "Supplier"
 
 # Define Edges
@@ -145,15 +171,16 @@ workflow.add_conditional_edges(
     },
 )
 
+# Routers that switch on a single field look the next node up directly
+GUARD_ROUTES = {"pass": "Cluster", "clarify": "Clarify", "ops": "Ops"}
+CLARIFY_HINT_ROUTES = {"cluster": "Cluster", "cash": "Cash"}
+COMMIT_ROUTES = {
+    "placed": "Learn", "reserved": "Learn", "awaiting_supplier_ack": "Learn", "backorder": "Learn",
+    "failed": "Ops",
+}
+
 def guard_router(state: RitveerState) -> str:
-    g = state.get("guard", {})
-    if g.get("action") == "pass":
-        return "Cluster"
-    if g.get("action") == "clarify":
-        return "Clarify"
-    if g.get("action") == "ops":
-        return "Ops"
-    return "__end__"  # drop
+    return GUARD_ROUTES.get(state.get("guard", {}).get("action"), "__end__")  # anything else is dropped
 
 def clarify_router(state):
     cl = state.get("clarify", {})
@@ -162,12 +189,7 @@ def clarify_router(state):
             return "Ops"
         return "Clarify"  # keep the loop until done or timeout
     # done: pick destination
-    hint = cl.get("next_hint")
-    if hint == "cluster":
-        return "Cluster"
-    if hint == "cash":
-        return "Cash"
-    return "Cluster"
+    return CLARIFY_HINT_ROUTES.get(cl.get("next_hint"), "Cluster")
 
 workflow.add_conditional_edge("Guard", guard_router, {
     "Cluster": "Cluster",
@@ -199,12 +221,9 @@ def supplier_router(state: RitveerState) -> str:
 workflow.add_conditional_edge("Supplier", supplier_router)
 
 def commit_router(state: RitveerState) -> str:
-    cm = state.get("commit", {})
-    if cm.get("status") in {"placed", "reserved", "awaiting_supplier_ack", "backorder"}:
-        return "Learn"  # record outcomes and move on
-    if cm.get("status") == "failed":
-        return "Ops"    # human fix
-    return "Commit"     # loop while finishing tasks
+    # placed/reserved/... record outcomes and move on, failed goes to a human
+    # fix, anything else loops while finishing tasks
+    return COMMIT_ROUTES.get(state.get("commit", {}).get("status"), "Commit")
 
 workflow.add_conditional_edge("Commit", commit_router, {"Learn": "Learn", "Ops": "Ops", "Commit": "Commit"})
 
@@ -223,10 +242,10 @@ def route_after_cash(state: RitveerState) -> str:
     Determines whether to route to manual review or continue based on cash risk.
     """
     if state.get("cash_risk_high"):
-        print("---ROUTER: High cash risk detected. Routing to END for manual review.---")
+        logger.debug("router %s -> %s (%s)", "cash", "END", "high cash risk, manual review")
         return END # Or a dedicated manual review agent
     else:
-        print("---ROUTER: No high cash risk. Routing to LearnAgent.---")
+        logger.debug("router %s -> %s", "cash", "Learn")
         return "Learn"
 
 workflow.add_conditional_edge("Cash", route_after_cash)
@@ -234,12 +253,26 @@ workflow.add_conditional_edge("Cash", route_after_cash)
 # Set End Points
 workflow.add_edge("Learn", END)
 
-# Compile the Graph
-compiled_workflow = workflow.compile()
+# Compiled on first use (normally the API's startup) and shared by every request
+_compiled_workflow = None
 
-def create_app():
-    """Factory function to create and return the compiled workflow"""
-    return compiled_workflow
+def create_app(checkpointer=None):
+    """
+    Factory function to create and return the compiled workflow. A
+    checkpointer (e.g. a Redis saver) can be passed to persist runs per
+    thread_id, so an interrupted run resumes instead of restarting from
+    Intake. This is only a hook: the API's lifespan calls create_app()
+    without one, so runs are not checkpointed today.
+    """
+    global _compiled_workflow
+    if checkpointer is not None:
+        return workflow.compile(checkpointer=checkpointer)
+    if _compiled_workflow is None:
+        _compiled_workflow = workflow.compile()
+    return _compiled_workflow
 
-# Export the compiled workflow
-app = create_app()
+def __getattr__(name):
+    # Keeps `from src.graph.workflow import app` working without compiling at import
+    if name == "app":
+        return create_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
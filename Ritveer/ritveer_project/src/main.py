@@ -1,10 +1,20 @@
 import os
 import sys
+import asyncio
+import json
+from contextlib import asynccontextmanager
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+    _loads = orjson.loads
+except ImportError:  # optional; ORJSONResponse needs orjson, stdlib json is the fallback
+    from fastapi.responses import JSONResponse as DefaultResponse
+    _loads = json.loads
 from .api.webhooks import router as webhooks_router
 # from .api.telegram import router as telegram_router  # TODO: Implement
 # from .api.ops import router as ops_router  # TODO: Implement
@@ -22,61 +32,89 @@ from .api.suppliers import router as suppliers_router
 from .api.research import router as research_router
 from .api.maps import router as maps_router
 from .state.store import reset_state
-# from .api.suppliers import router as suppliers_router  # TODO: Implement
 from src.tools.policy import policy as policy_store, env_overrides
 from .tools.scheduler import start as start_scheduler
 from .jobs.events_refresh import refresh_events
-# from src.graph.workflow import app as workflow_app  # TODO: Fix imports
+from .utils.logging_config import setup_logging
+from .agents.supplier_agent import close_discovery_client
+from .tools.google_maps_tools import close_maps_client
+from .tools.razorpay_tools import close_razorpay_client
+from config.settings import get_settings
+from src.graph.workflow import create_app, current_policy, invalidate_policy
 
-app = FastAPI(title="Ritveer API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in each worker process, so every worker owns its log threads
+    setup_logging()
+    # Compile the graph once, before the first request, and share it. No
+    # checkpointer is bound, so runs are not resumable
+    app.state.workflow = await asyncio.to_thread(create_app)
+    # run refresh once a day
+    start_scheduler(app, tasks=[(24*3600, refresh_events)])
+    yield
+    await close_discovery_client()
+    await close_maps_client()
+    await close_razorpay_client()
+
+app = FastAPI(title="Ritveer API", default_response_class=DefaultResponse, lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=list(get_settings().ALLOWED_ORIGINS),
+    allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    max_age=86400,  # browsers cache preflights for a day
 )
 
 app.mount("/exports", StaticFiles(directory="./exports"), name="exports")
 
-app.include_router(webhooks_router)
-# app.include_router(telegram_router)  # TODO: Implement
-# app.include_router(ops_router)  # TODO: Implement
-app.include_router(rfp_router)
-app.include_router(pay_router)
-app.include_router(cash_router)
-app.include_router(events_router)
-app.include_router(admin_router)
-app.include_router(price_router)
-app.include_router(learn_router)
-app.include_router(metrics_router)
-app.include_router(catalog_router)
-app.include_router(catalog_share_router)
-app.include_router(suppliers_router)
-app.include_router(research_router)
-app.include_router(maps_router)
-# app.state.workflow = workflow_app  # TODO: Fix imports
+# Registration order is route-matching order
+_ROUTERS = (
+    webhooks_router,
+    # telegram_router,  # TODO: Implement
+    # ops_router,  # TODO: Implement
+    rfp_router,
+    pay_router,
+    cash_router,
+    events_router,
+    admin_router,
+    price_router,
+    learn_router,
+    metrics_router,
+    catalog_router,
+    catalog_share_router,
+    suppliers_router,
+    research_router,
+    maps_router,
+)
+for _router in _ROUTERS:
+    app.include_router(_router)
 
 @app.post("/invoke")
-async def invoke(request: dict):
-    inputs = {"initial_query": request.get("message")}
-    return app.state.workflow.invoke(inputs)
+async def invoke(request: Request):
+    # Parsed straight from the raw bytes rather than through a dict body model
+    try:
+        payload = _loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail={"error": "invalid_json"})
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail={"error": "expected_object"})
+    inputs = {"initial_query": payload.get("message")}
+    # Several nodes are coroutines, so the graph has to run on the event loop
+    return await app.state.workflow.ainvoke(inputs)
 
 @app.get("/policy")
 def get_policy():
-    return policy_store.dict()
+    return current_policy()
 
 @app.post("/policy/reload")
 def reload_policy():
     ok, err = policy_store.reload()
     if not ok:
         raise HTTPException(status_code=400, detail={"error": "validation_failed", "details": err})
+    invalidate_policy()
     return {"ok": True}
 
-@app.on_event("startup")
-async def _boot_jobs():
-    # run refresh once a day
-    start_scheduler(app, tasks=[(24*3600, refresh_events)])
-
 @app.get("/policy/raw")
 def get_policy_raw():
     return policy_store.raw()
@@ -1,43 +1,143 @@
-import requests
+import hashlib, json, logging, re, time
+from collections import OrderedDict
+import httpx
+from redis.exceptions import RedisError
 from typing import Dict, Any
-from config.settings import settings
+from config.settings import get_settings
+from src.utils.redis_utils import get_async_redis
 
+logger = logging.getLogger(__name__)
 
-def search_places(query: str, location: str, radius: int = 5000) -> Dict[str, Any]:
+_maps_http: httpx.AsyncClient | None = None
+
+
+def _maps_client() -> httpx.AsyncClient:
+    """Shared client for the Maps APIs, so keep-alive connections and TLS sessions are reused"""
+    global _maps_http
+    if _maps_http is None:
+        _maps_http = httpx.AsyncClient(
+            timeout=5.0, limits=httpx.Limits(max_connections=100, max_keepalive_connections=20))
+    return _maps_http
+
+
+async def close_maps_client() -> None:
+    global _maps_http
+    if _maps_http is not None:
+        await _maps_http.aclose()
+        _maps_http = None
+
+
+# Successful Maps responses are memoized in process and in Redis: geocodes
+# for a month, place searches for a day since POIs change more often
+GEOCODE_TTL_S = 30 * 24 * 3600
+PLACES_TTL_S = 24 * 3600
+_MAPS_CACHE_MAX = 4096
+# key -> (monotonic expiry, response JSON); kept serialized so every hit
+# hands the caller its own objects
+_maps_cache: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+_SPACES = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _SPACES.sub(" ", text.strip().lower())
+
+
+def _cache_key(kind: str, *parts) -> str:
+    digest = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=16).hexdigest()
+    return f"maps:{kind}:{digest}"
+
+
+async def _cached(key: str, ttl_s: int) -> Dict[str, Any] | None:
+    entry = _maps_cache.get(key)
+    if entry is not None and entry[0] > time.monotonic():
+        _maps_cache.move_to_end(key)
+        return json.loads(entry[1])
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            raw, remaining_s = await pipe.get(key).ttl(key).execute()
+    except RedisError:
+        return None
+    if raw is None:
+        return None
+    # Memoized only for what is left of the Redis TTL, so it can't outlive it
+    if remaining_s > 0:
+        _remember(key, raw, remaining_s)
+    elif remaining_s == -1:  # no expiry on the key
+        _remember(key, raw, ttl_s)
+    return json.loads(raw)
+
+
+def _remember(key: str, raw: str, ttl_s: int) -> None:
+    _maps_cache[key] = (time.monotonic() + ttl_s, raw)
+    _maps_cache.move_to_end(key)
+    if len(_maps_cache) > _MAPS_CACHE_MAX:
+        _maps_cache.popitem(last=False)
+
+
+async def _store(key: str, result: Dict[str, Any], ttl_s: int) -> None:
+    # Only "OK" answers are stable enough to reuse; errors and empty results are retried
+    if result.get("status") != "OK":
+        return
+    raw = json.dumps(result)
+    _remember(key, raw, ttl_s)
+    try:
+        await get_async_redis().setex(key, ttl_s, raw)
+    except RedisError:
+        pass
+
+
+def clear_maps_cache() -> None:
+    """Drops the in-process tier; Redis entries age out on their TTL"""
+    _maps_cache.clear()
+
+
+async def search_places(query: str, location: str, radius: int = 5000) -> Dict[str, Any]:
     """Search for places using the Google Maps Places API."""
-    print(f"GOOGLE MAPS TOOL: Searching for places with query '{query}' near '{location}' within {radius} meters.")
-    api_key = settings.GOOGLE_MAPS_API_KEY
+    logger.debug("GOOGLE MAPS TOOL: Searching for places with query '%s' near '%s' within %s meters.", query, location, radius)
+    api_key = get_settings().GOOGLE_MAPS_API_KEY
     if not api_key:
         return {"status": "failed", "message": "Google Maps API Key not configured."}
     base_url = "https://maps.googleapis.com/maps/api/place/textsearch/json"
     params = {"query": query, "location": location, "radius": radius, "key": api_key}
+    key = _cache_key("places", _normalize(query), _normalize(location), radius)
+    cached = await _cached(key, PLACES_TTL_S)
+    if cached is not None:
+        return cached
     try:
-        response = requests.get(base_url, params=params)
+        response = await _maps_client().get(base_url, params=params)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"GOOGLE MAPS TOOL: Error searching places: {e}")
+        result = response.json()
+    except httpx.HTTPError as e:
+        logger.warning("GOOGLE MAPS TOOL: Error searching places: %s", e)
         return {"status": "failed", "message": f"Google Maps API error: {str(e)}"}
+    await _store(key, result, PLACES_TTL_S)
+    return result
 
 
-def geocode_address(address: str) -> Dict[str, Any]:
+async def geocode_address(address: str) -> Dict[str, Any]:
     """Geocode a human readable address into latitude and longitude."""
-    print(f"GOOGLE MAPS TOOL: Geocoding address '{address}'.")
-    api_key = settings.GOOGLE_MAPS_API_KEY
+    logger.debug("GOOGLE MAPS TOOL: Geocoding address '%s'.", address)
+    api_key = get_settings().GOOGLE_MAPS_API_KEY
     if not api_key:
         return {"status": "failed", "message": "Google Maps API Key not configured."}
     base_url = "https://maps.googleapis.com/maps/api/geocode/json"
     params = {"address": address, "key": api_key}
+    key = _cache_key("geo", _normalize(address))
+    cached = await _cached(key, GEOCODE_TTL_S)
+    if cached is not None:
+        return cached
     try:
-        response = requests.get(base_url, params=params)
+        response = await _maps_client().get(base_url, params=params)
         response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"GOOGLE MAPS TOOL: Error geocoding address: {e}")
+        result = response.json()
+    except httpx.HTTPError as e:
+        logger.warning("GOOGLE MAPS TOOL: Error geocoding address: %s", e)
         return {"status": "failed", "message": f"Google Maps API error: {str(e)}"}
+    await _store(key, result, GEOCODE_TTL_S)
+    return result
 
 
 def book_kiosk(place_id: str, booking_details: Dict[str, Any]) -> Dict[str, Any]:
     """Simulate booking a kiosk at a given place_id."""
-    print(f"GOOGLE MAPS TOOL: Simulating booking kiosk at place ID '{place_id}' with details: {booking_details}")
+    logger.debug("GOOGLE MAPS TOOL: Simulating booking kiosk at place ID '%s' with details: %s", place_id, booking_details)
     return {"status": "success", "message": f"Kiosk at {place_id} booked successfully (simulated).", "booking_id": "BOOK" + place_id[:5].upper() + "123"}
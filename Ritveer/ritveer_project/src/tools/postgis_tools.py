@@ -1,12 +1,17 @@
+import logging
+import threading
 import psycopg2
-from psycopg2 import extras
-from typing import List, Dict, Any, Optional
-from config.settings import settings
+from psycopg2 import extras, pool
+from typing import List, Dict, Any, Optional, Tuple
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
 
 def get_db_connection():
     """
     Establishes a connection to the PostgreSQL database.
     """
+    settings = get_settings()
     conn = psycopg2.connect(
         host=settings.POSTGRES_HOST,
         port=settings.POSTGRES_PORT,
@@ -16,6 +21,43 @@ def get_db_connection():
     )
     return conn
 
+_pool: pool.ThreadedConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+def get_db_pool() -> pool.ThreadedConnectionPool:
+    """
+    Process-wide connection pool, created on first use. Thread-safe, so
+    the tools can also run under asyncio.to_thread.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                settings = get_settings()
+                _pool = pool.ThreadedConnectionPool(
+                    2, 20,
+                    host=settings.POSTGRES_HOST,
+                    port=settings.POSTGRES_PORT,
+                    database=settings.POSTGRES_DB,
+                    user=settings.POSTGRES_USER,
+                    password=settings.POSTGRES_PASSWORD
+                )
+    return _pool
+
+def acquire_connection():
+    """Borrows a pooled connection; give it back with release_connection."""
+    return get_db_pool().getconn()
+
+def release_connection(conn) -> None:
+    # Never hand a connection back mid-transaction; broken ones are discarded
+    broken = bool(conn.closed)
+    if not broken:
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+    get_db_pool().putconn(conn, close=broken)
+
 def find_artisan_clusters(
     target_location: Dict[str, float],  # e.g., {"latitude": 12.9716, "longitude": 77.5946}
     k_clusters: int = 3,
@@ -36,7 +78,7 @@ def find_artisan_clusters(
     conn = None
     cur = None
     try:
-        conn = get_db_connection()
+        conn = acquire_connection()
         cur = conn.cursor(cursor_factory=extras.RealDictCursor)
 
         query = f"""
@@ -66,13 +108,13 @@ def find_artisan_clusters(
         clusters = cur.fetchall()
         return clusters
     except Exception as e:
-        print(f"Error finding artisan clusters: {e}")
+        logger.warning("Error finding artisan clusters: %s", e)
         return []
     finally:
         if cur:
             cur.close()
         if conn:
-            conn.close()
+            release_connection(conn)
 
 def record_transaction(
     transaction_id: str,
@@ -99,7 +141,7 @@ def record_transaction(
     conn = None
     cur = None
     try:
-        conn = get_db_connection()
+        conn = acquire_connection()
         cur = conn.cursor()
         
         query = """
@@ -123,7 +165,7 @@ def record_transaction(
             "timestamp": result[1]
         }
     except Exception as e:
-        print(f"LEDGER TOOL: Error recording transaction: {e}")
+        logger.error("LEDGER TOOL: Error recording transaction: %s", e)
         if conn:
             conn.rollback()
         return {"error": str(e)}
@@ -131,7 +173,15 @@ def record_transaction(
         if cur:
             cur.close()
         if conn:
-            conn.close()
+            release_connection(conn)
+
+UPSERT_RELIABILITY_SQL = """
+    INSERT INTO suppliers (name, reliability_score)
+    VALUES (%s, %s)
+    ON CONFLICT (name) DO UPDATE
+    SET reliability_score = suppliers.reliability_score + EXCLUDED.reliability_score
+    RETURNING id, name, reliability_score;
+"""
 
 def update_supplier_reliability(supplier_name: str, score_change: float) -> Dict[str, Any]:
     """
@@ -148,22 +198,12 @@ def update_supplier_reliability(supplier_name: str, score_change: float) -> Dict
     conn = None
     cur = None
     try:
-        conn = get_db_connection()
+        conn = acquire_connection()
         cur = conn.cursor(cursor_factory=extras.RealDictCursor)
         
-        # Ensure supplier exists, or insert with default score
-        cur.execute("""
-            INSERT INTO suppliers (name, reliability_score)
-            VALUES (%s, 0.0)
-            ON CONFLICT (name) DO NOTHING;
-        """, (supplier_name,))
-        
-        cur.execute("""
-            UPDATE suppliers
-            SET reliability_score = reliability_score + %s
-            WHERE name = %s
-            RETURNING id, name, reliability_score;
-        """, (score_change, supplier_name))
+        # New suppliers start from 0.0, so inserting score_change is the same
+        # as creating the row and then adding to it; one statement either way
+        cur.execute(UPSERT_RELIABILITY_SQL, (supplier_name, score_change))
         
         updated_supplier = cur.fetchone()
         conn.commit()
@@ -174,7 +214,7 @@ def update_supplier_reliability(supplier_name: str, score_change: float) -> Dict
             return {"error": f"Supplier {supplier_name} not found or not updated."}
             
     except Exception as e:
-        print(f"LEARN TOOL: Error updating supplier reliability: {e}")
+        logger.warning("LEARN TOOL: Error updating supplier reliability: %s", e)
         if conn:
             conn.rollback()
         return {"error": str(e)}
@@ -182,4 +222,40 @@ def update_supplier_reliability(supplier_name: str, score_change: float) -> Dict
         if cur:
             cur.close()
         if conn:
-            conn.close()
+            release_connection(conn)
+
+def update_supplier_reliabilities(changes: List[Tuple[str, float]]) -> List[Dict[str, Any]]:
+    """
+    Batch form of update_supplier_reliability: applies every (supplier_name,
+    score_change) pair in one statement and one transaction.
+
+    Returns:
+        The updated supplier rows, or a single-element list with an error.
+    """
+    # One row per supplier; ON CONFLICT can't touch the same row twice
+    totals: Dict[str, float] = {}
+    for name, change in changes:
+        totals[name] = totals.get(name, 0.0) + change
+    if not totals:
+        return []
+
+    conn = None
+    cur = None
+    try:
+        conn = acquire_connection()
+        cur = conn.cursor(cursor_factory=extras.RealDictCursor)
+        rows = extras.execute_values(
+            cur, UPSERT_RELIABILITY_SQL.replace("VALUES (%s, %s)", "VALUES %s"),
+            list(totals.items()), fetch=True)
+        conn.commit()
+        return rows
+    except Exception as e:
+        logger.warning("LEARN TOOL: Error updating supplier reliabilities: %s", e)
+        if conn:
+            conn.rollback()
+        return [{"error": str(e)}]
+    finally:
+        if cur:
+            cur.close()
+        if conn:
+            release_connection(conn)
@@ -1,5 +1,15 @@
+import re
+import logging
 from typing import Dict, Any, List
 
+logger = logging.getLogger(__name__)
+
+# Runs of anything outside [a-z0-9] collapse to one hyphen, in a single C-level pass
+_SLUG_SEP = re.compile(r"[^a-z0-9]+")
+
+def store_slug(store_name: str) -> str:
+    return _SLUG_SEP.sub("-", store_name.lower()).strip("-")
+
 def generate_pwa_microstore(store_name: str, location: str, products: List[str]) -> Dict[str, Any]:
     """
     Simulates the generation of a PWA micro-store.
@@ -14,7 +24,7 @@ def generate_pwa_microstore(store_name: str, location: str, products: List[str])
         A dictionary indicating the success or failure of the PWA generation,
         and potentially a URL to the generated store.
     """
-    print(f"PWA TOOL: Simulating PWA micro-store generation for '{store_name}' at '{location}'.")
+    logger.info("PWA TOOL: Simulating PWA micro-store generation for '%s' at '%s'.", store_name, location)
     # Simulate successful PWA generation
-    pwa_url = f"https://microstore.example.com/{store_name.lower().replace(' ', '-')}"
+    pwa_url = f"https://microstore.example.com/{store_slug(store_name)}"
     return {"status": "success", "message": "PWA micro-store generated successfully (simulated).", "url": pwa_url}
@@ -1,10 +1,42 @@
-import razorpay
+import asyncio
+import logging
+import httpx
 from typing import Dict, Any
-from config.settings import settings
-import requests # Import requests to catch connection errors
+from config.settings import get_settings
 from src.utils.redis_utils import add_to_retry_stream
+try:
+    import h2  # httpx needs it for http2=True
+except ImportError:  # optional; HTTP/1.1 is the fallback
+    h2 = None
 
-def create_payment_order(amount: float, currency: str, receipt: str) -> Dict[str, Any]:
+logger = logging.getLogger(__name__)
+
+RAZORPAY_API_BASE = "https://api.razorpay.com"
+
+_razor_http: httpx.AsyncClient | None = None
+
+
+def _razor_client() -> httpx.AsyncClient:
+    """Shared Razorpay client, so order creation never blocks the event loop
+    and keep-alive connections are reused"""
+    global _razor_http
+    if _razor_http is None:
+        settings = get_settings()
+        _razor_http = httpx.AsyncClient(
+            base_url=RAZORPAY_API_BASE,
+            auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+            http2=h2 is not None, timeout=10.0)
+    return _razor_http
+
+
+async def close_razorpay_client() -> None:
+    global _razor_http
+    if _razor_http is not None:
+        await _razor_http.aclose()
+        _razor_http = None
+
+
+async def create_payment_order(amount: float, currency: str, receipt: str) -> Dict[str, Any]:
     """
     Creates a payment order using the Razorpay API.
 
@@ -16,10 +48,8 @@ def create_payment_order(amount: float, currency: str, receipt: str) -> Dict[str
     Returns:
         A dictionary containing the Razorpay order details, or an error message.
     """
-    print(f"RAZORPAY TOOL: Creating payment order for {amount} {currency}")
+    logger.debug("RAZORPAY TOOL: Creating payment order for %s %s", amount, currency)
     try:
-        client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-        
         # Razorpay amount is in the smallest unit (e.g., paise for INR)
         # Convert amount to integer paise
         amount_paise = int(amount * 100)
@@ -31,17 +61,18 @@ def create_payment_order(amount: float, currency: str, receipt: str) -> Dict[str
             "payment_capture": '1'  # Auto capture payment
         }
         
-        order = client.order.create(order_payload)
-        return order
-    except requests.exceptions.ConnectionError as e:
-        print(f"RAZORPAY TOOL: Network error creating payment order: {e}. Queuing for retry.")
+        r = await _razor_client().post("/v1/orders", json=order_payload)
+        r.raise_for_status()
+        return r.json()
+    except httpx.ConnectError as e:
+        logger.warning("RAZORPAY TOOL: Network error creating payment order: %s. Queuing for retry.", e)
         task_details = {
             "agent": "commit_agent", # Assuming commit_agent calls this tool
             "tool": "create_payment_order",
             "args": {"amount": amount, "currency": currency, "receipt": receipt}
         }
-        add_to_retry_stream(task_details)
+        await asyncio.to_thread(add_to_retry_stream, task_details)
         return {"status": "retry_queued", "message": f"Network error: {str(e)}. Task queued for retry."}
     except Exception as e:
-        print(f"RAZORPAY TOOL: Error creating payment order: {e}")
+        logger.error("RAZORPAY TOOL: Error creating payment order: %s", e)
         return {"status": "failed", "message": f"Razorpay API error: {str(e)}"}
@@ -1,6 +1,201 @@
-from typing import List, Dict, Any
+import asyncio, hashlib, json, re, threading, time
+import logging
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import List, Dict, Any, Iterable
+import httpx
 import requests
-from bs4 import BeautifulSoup
+from redis.exceptions import RedisError
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # optional; the streaming html.parser scan is the fallback
+    LexborHTMLParser = None
+from src.utils.redis_utils import get_redis_client, get_async_redis
+from src.utils.http_client import get_http_session, USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+# connect, read
+SCRAPE_TIMEOUT = (3.05, 10)
+
+# A page's validators (ETag / Last-Modified) and the products parsed from it
+# are kept per (url, item), so an unchanged page comes back as an empty 304.
+# Within SCRAPE_FRESH_S of a fetch the products are reused without any request
+# at all, from process memory or from Redis; pages without validators are
+# kept only that long.
+SCRAPE_CACHE_TTL_S = 7 * 24 * 3600
+SCRAPE_FRESH_S = 300
+_SCRAPE_MEMO_MAX = 2048
+# key -> (monotonic expiry, products); scrapes run on worker threads
+_scrape_memo: "OrderedDict[str, tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+_scrape_memo_lock = threading.Lock()
+
+def _scrape_cache_key(url: str, item_name: str) -> str:
+    # Item matching is case-insensitive, so "Teak Wood " and "teak wood" share an entry
+    digest = hashlib.blake2b(f"{url}\x1f{item_name.strip().lower()}".encode(), digest_size=16).hexdigest()
+    return f"scrape:page:{digest}"
+
+def _memo_get(key: str) -> List[Dict[str, Any]] | None:
+    with _scrape_memo_lock:
+        entry = _scrape_memo.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        _scrape_memo.move_to_end(key)
+        # Copies in and out, so no caller's edits reach the memo; the fields are strings
+        return [dict(p) for p in entry[1]]
+
+def _memo_put(key: str, products: List[Dict[str, Any]], ttl_s: float = SCRAPE_FRESH_S) -> None:
+    with _scrape_memo_lock:
+        _scrape_memo[key] = (time.monotonic() + ttl_s, [dict(p) for p in products])
+        _scrape_memo.move_to_end(key)
+        if len(_scrape_memo) > _SCRAPE_MEMO_MAX:
+            _scrape_memo.popitem(last=False)
+
+def _fresh_products(key: str, cached: Dict[str, Any] | None) -> List[Dict[str, Any]] | None:
+    """Products from a Redis entry fetched under SCRAPE_FRESH_S ago, memoized for the rest of that window"""
+    if not cached:
+        return None
+    remaining = SCRAPE_FRESH_S - (time.time() - cached.get("fetched_at", 0))
+    if remaining <= 0:
+        return None
+    _memo_put(key, cached["products"], remaining)
+    return cached["products"]
+
+def _conditional_headers(cached: Dict[str, Any] | None) -> Dict[str, str]:
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+def _cache_entry(response_headers, products: List[Dict[str, Any]]) -> tuple[str, int]:
+    """Serialized cache entry and its TTL; short when the page has nothing to revalidate with"""
+    etag, last_modified = response_headers.get("ETag"), response_headers.get("Last-Modified")
+    ttl_s = SCRAPE_CACHE_TTL_S if etag or last_modified else SCRAPE_FRESH_S
+    return json.dumps({"etag": etag, "last_modified": last_modified, "fetched_at": time.time(),
+                       "products": products}), ttl_s
+
+PRICE_TAGS = frozenset({"span", "div", "p"})
+
+def _is_price_class(cls: str | None) -> bool:
+    return bool(cls) and any("price" in c.lower() for c in cls.split())
+
+def _find_prices_lexbor(html: str, item_re: re.Pattern) -> List[str]:
+    """
+    One document-order walk with the C parser: every text node that mentions
+    the item takes the first span/div/p after it whose class mentions "price".
+    """
+    prices, pending = [], 0
+    for node in LexborHTMLParser(html).root.traverse(include_text=True):
+        if node.tag == "-text":
+            if item_re.search(node.text_content or ""):
+                pending += 1
+        elif pending and node.tag in PRICE_TAGS and _is_price_class(node.attributes.get("class")):
+            prices.extend([node.text(strip=True)] * pending)
+            pending = 0
+    prices.extend(["N/A"] * pending)
+    return prices
+
+VOID_TAGS = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input",
+                       "link", "meta", "source", "track", "wbr"})
+
+class _PriceScanner(HTMLParser):
+    """
+    The same walk as _find_prices_lexbor over parser events, for when
+    selectolax isn't installed: no tree is built, and only the text of the
+    price element being read is held.
+    """
+    def __init__(self, item_re: re.Pattern):
+        super().__init__(convert_charrefs=True)
+        self.item_re = item_re
+        self.prices: List[str] = []
+        self.pending = 0
+        self._claims = 0   # pending items the open price element resolves
+        self._depth = 0    # nesting inside that element; 0 when none is open
+        self._parts: List[str] = []
+        self._text: List[str] = []  # current text node; it can arrive in pieces
+
+    def _end_text(self):
+        if not self._text:
+            return
+        data = "".join(self._text)
+        self._text = []
+        if self._depth:
+            stripped = data.strip()
+            if stripped:
+                self._parts.append(stripped)
+        if self.item_re.search(data):
+            self.pending += 1
+
+    def handle_starttag(self, tag, attrs):
+        self._end_text()
+        if self._depth:
+            if tag not in VOID_TAGS:
+                self._depth += 1
+        elif self.pending and tag in PRICE_TAGS and _is_price_class(dict(attrs).get("class")):
+            self._claims, self.pending = self.pending, 0
+            self._depth, self._parts = 1, []
+
+    def handle_endtag(self, tag):
+        self._end_text()
+        if self._depth and tag not in VOID_TAGS:
+            self._depth -= 1
+            if not self._depth:
+                self.prices.extend(["".join(self._parts)] * self._claims)
+
+    def handle_data(self, data):
+        self._text.append(data)
+
+    def handle_comment(self, data):
+        self._end_text()
+
+    def finish(self) -> List[str]:
+        self.close()
+        self._end_text()
+        if self._depth:  # price element left open at end of document
+            self.prices.extend(["".join(self._parts)] * self._claims)
+        self.prices.extend(["N/A"] * self.pending)
+        return self.prices
+
+def _find_prices_stream(chunks: Iterable[str], item_re: re.Pattern) -> List[str]:
+    scanner = _PriceScanner(item_re)
+    for chunk in chunks:
+        scanner.feed(chunk)
+    return scanner.finish()
+
+def _parse_products(html: str | Iterable[str], url: str, item_name: str) -> List[Dict[str, Any]]:
+    """
+    Pulls the item's product entries out of a fetched supplier page. `html`
+    is the page, or its decoded chunks as they arrive off the socket.
+    """
+    # Placeholder for actual scraping logic
+    # In a real scenario, you would parse the HTML to find product details
+    # This is a very basic example, real scraping needs specific selectors
+    item_re = re.compile(re.escape(item_name), re.IGNORECASE)
+    if LexborHTMLParser is not None:
+        prices = _find_prices_lexbor(html if isinstance(html, str) else "".join(html), item_re)
+    else:
+        prices = _find_prices_stream((html,) if isinstance(html, str) else html, item_re)
+    found_products = [{
+        "supplier_name": url, # Using URL as supplier name for now
+        "item": item_name,
+        "price": price,
+        "url": url # Link to the product page if available
+    } for price in prices]
+
+    if not found_products:
+        # If no specific products found, return a generic "found" status
+        return [{
+            "supplier_name": url,
+            "item": item_name,
+            "price": "Varies",
+            "url": url,
+            "status": "Item might be available, needs further check."
+        }]
+    
+    return found_products
 
 def scrape_supplier_website(url: str, item_name: str) -> List[Dict[str, Any]]:
     """
@@ -16,45 +211,114 @@ def scrape_supplier_website(url: str, item_name: str) -> List[Dict[str, Any]]:
         A list of dictionaries, where each dictionary represents a product
         found on the website with its price and other relevant information.
     """
-    print(f"SCRAPER TOOL: Scraping {url} for {item_name}")
+    key = _scrape_cache_key(url, item_name)
+    hit = _memo_get(key)
+    if hit is not None:
+        return hit
+    logger.info("SCRAPER TOOL: Scraping %s for %s", url, item_name)
+    cached = None
+    redis_client = get_redis_client()
+    if redis_client:
+        try:
+            raw = redis_client.get(key)
+            cached = json.loads(raw) if raw else None
+        except RedisError:
+            pass
+    hit = _fresh_products(key, cached)
+    if hit is not None:
+        return hit
     try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Placeholder for actual scraping logic
-        # In a real scenario, you would parse the HTML to find product details
-        # For demonstration, we'll return dummy data
-        
-        # Example: Look for elements containing the item_name and extract price
-        found_products = []
-        # This is a very basic example, real scraping needs specific selectors
-        for tag in soup.find_all(text=lambda text: text and item_name.lower() in text.lower()):
-            # Try to find a price near the item name
-            price_tag = tag.find_next(['span', 'div', 'p'], class_=lambda x: x and 'price' in x.lower())
-            price = price_tag.get_text(strip=True) if price_tag else "N/A"
-            found_products.append({
-                "supplier_name": url, # Using URL as supplier name for now
-                "item": item_name,
-                "price": price,
-                "url": url # Link to the product page if available
-            })
-        
-        if not found_products:
-            # If no specific products found, return a generic "found" status
-            return [{
-                "supplier_name": url,
-                "item": item_name,
-                "price": "Varies",
-                "url": url,
-                "status": "Item might be available, needs further check."
-            }]
-        
-        return found_products
+        # Streamed, so the fallback scanner parses while the body is arriving
+        with get_http_session().get(url, timeout=SCRAPE_TIMEOUT, headers=_conditional_headers(cached),
+                                    stream=True) as response:
+            response.raise_for_status()  # Raise an exception for HTTP errors
+            if response.status_code == 304 and cached:
+                _memo_put(key, cached["products"])
+                return cached["products"]
+            if response.encoding is None:
+                response.encoding = "utf-8"
+            products = _parse_products(response.iter_content(chunk_size=65536, decode_unicode=True),
+                                       url, item_name)
+        _memo_put(key, products)
+        if redis_client:
+            entry, ttl_s = _cache_entry(response.headers, products)
+            try:
+                redis_client.setex(key, ttl_s, entry)
+            except RedisError:
+                pass
+        return products
 
     except requests.exceptions.RequestException as e:
-        print(f"SCRAPER TOOL: Error scraping {url}: {e}")
+        logger.warning("SCRAPER TOOL: Error scraping %s: %s", url, e)
         return []
-    except Exception as e:
-        print(f"SCRAPER TOOL: An unexpected error occurred: {e}")
+    except Exception:
+        logger.exception("SCRAPER TOOL: An unexpected error occurred scraping %s", url)
         return []
+
+# Pages in flight per batch, so a big batch stays polite to suppliers
+SCRAPE_CONCURRENCY = 8
+
+async def scrape_supplier_websites_async(
+    urls: List[str], item_name: str, concurrency: int = SCRAPE_CONCURRENCY
+) -> List[Dict[str, Any]]:
+    """
+    Batch form of scrape_supplier_website: fetches every URL concurrently over
+    one pooled client, so a batch takes about as long as its slowest page.
+
+    Args:
+        urls: Supplier website URLs to scrape.
+        item_name: The name of the item to search for.
+        concurrency: Maximum number of pages fetched at once.
+
+    Returns:
+        The products found on all pages, in the order of `urls`. Pages that
+        fail to load contribute nothing.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=3.05), limits=limits,
+                                 headers={"User-Agent": USER_AGENT}, follow_redirects=True) as client:
+        async def _scrape(url: str) -> List[Dict[str, Any]]:
+            key = _scrape_cache_key(url, item_name)
+            hit = _memo_get(key)
+            if hit is not None:
+                return hit
+            logger.info("SCRAPER TOOL: Scraping %s for %s", url, item_name)
+            try:
+                raw = await get_async_redis().get(key)
+                cached = json.loads(raw) if raw else None
+            except RedisError:
+                cached = None
+            hit = _fresh_products(key, cached)
+            if hit is not None:
+                return hit
+            try:
+                async with sem:
+                    response = await client.get(url, headers=_conditional_headers(cached))
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                logger.warning("SCRAPER TOOL: Error scraping %s: %s", url, e)
+                return []
+            if response.status_code == 304 and cached:
+                _memo_put(key, cached["products"])
+                return cached["products"]
+            # Parsing is CPU-bound; keep it off the event loop
+            products = await asyncio.to_thread(_parse_products, response.text, url, item_name)
+            _memo_put(key, products)
+            entry, ttl_s = _cache_entry(response.headers, products)
+            try:
+                await get_async_redis().setex(key, ttl_s, entry)
+            except RedisError:
+                pass
+            return products
+
+        pages = await asyncio.gather(*[_scrape(u) for u in urls], return_exceptions=True)
+
+    products = []
+    for url, page in zip(urls, pages):
+        if isinstance(page, Exception):
+            logger.error("SCRAPER TOOL: An unexpected error occurred scraping %s", url, exc_info=page)
+            continue
+        products.extend(page)
+    return products
@@ -1,6 +1,7 @@
-import requests
-from typing import Dict, Any
-from config.settings import settings
+import logging
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
 
 def create_shiprocket_shipment(order_details: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -12,7 +13,7 @@ def create_shiprocket_shipment(order_details: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         A dictionary containing shipment details (e.g., tracking_id, label_url).
     """
-    print("SHIPPING TOOL: Creating Shiprocket shipment (placeholder)")
+    logger.info("SHIPPING TOOL: Creating Shiprocket shipment (placeholder)")
     # In a real scenario, you would make an API call to Shiprocket
     # For demonstration, return dummy data
     try:
@@ -32,9 +33,49 @@ def create_shiprocket_shipment(order_details: Dict[str, Any]) -> Dict[str, Any]:
             "status": "success"
         }
     except Exception as e:
-        print(f"SHIPPING TOOL: Error creating Shiprocket shipment: {e}")
+        logger.exception("SHIPPING TOOL: Error creating Shiprocket shipment")
         return {"error": str(e)}
 
+# Orders per bulk create request
+SHIPROCKET_BULK_MAX = 32
+
+def create_shiprocket_shipments_bulk(orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Creates shipments for many orders, in batches of up to
+    SHIPROCKET_BULK_MAX orders. A placeholder like create_shiprocket_shipment:
+    no request is made yet; each batch is meant to become one bulk POST
+    instead of one POST per order.
+
+    Args:
+        orders: Order details dictionaries, as for create_shiprocket_shipment.
+
+    Returns:
+        One shipment details dictionary per order, in the same order.
+    """
+    logger.info("SHIPPING TOOL: Creating %d Shiprocket shipments in bulk (placeholder)", len(orders))
+    results = []
+    for start in range(0, len(orders), SHIPROCKET_BULK_MAX):
+        batch = orders[start:start + SHIPROCKET_BULK_MAX]
+        try:
+            # url = "https://apiv2.shiprocket.in/v1/external/orders/create/bulk"
+            # headers = {
+            #     "Content-Type": "application/json",
+            #     "Authorization": f"Bearer {settings.SHIPROCKET_API_KEY}"
+            # }
+            # response = requests.post(url, headers=headers, json={"orders": batch})
+            # response.raise_for_status()
+            # results.extend(response.json())
+
+            results.extend({
+                "tracking_id": f"SR{start + i:09d}",
+                "shipping_label_url": f"http://example.com/shiprocket_label_{start + i}.pdf",
+                "status": "success"
+            } for i in range(len(batch)))
+        except Exception as e:
+            logger.exception("SHIPPING TOOL: Error creating Shiprocket shipments")
+            results.extend({"error": str(e)} for _ in batch)
+    return results
+
 def create_india_post_shipment(order_details: Dict[str, Any]) -> Dict[str, Any]:
     """
     Creates a shipment using the India Post API.
@@ -45,7 +86,7 @@ def create_india_post_shipment(order_details: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         A dictionary containing shipment details (e.g., tracking_id, label_url).
     """
-    print("SHIPPING TOOL: Creating India Post shipment (placeholder)")
+    logger.info("SHIPPING TOOL: Creating India Post shipment (placeholder)")
     # In a real scenario, you would make an API call to India Post
     # For demonstration, return dummy data
     return {
@@ -1,6 +1,23 @@
-from typing import Dict, Any
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
 from twilio.rest import Client
-from config.settings import settings
+from twilio.http.http_client import TwilioHttpClient
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+TWILIO_TIMEOUT_S = 15.0
+
+@functools.lru_cache(maxsize=1)
+def _client() -> Client:
+    """Shared Twilio REST client, so its HTTP session is reused across sends"""
+    # pool_connections keeps one requests.Session, and with it the TLS
+    # connection to api.twilio.com, for the life of the client
+    http_client = TwilioHttpClient(pool_connections=True, max_retries=3, timeout=TWILIO_TIMEOUT_S)
+    settings = get_settings()
+    return Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN, http_client=http_client)
 
 def parse_twilio_webhook(webhook_data: Dict[str, Any]) -> Dict[str, str]:
     """
@@ -35,19 +52,37 @@ def send_sms(to_phone_number: str, message: str) -> Dict[str, Any]:
     Returns:
         A dictionary containing the Twilio message SID and status.
     """
-    print(f"TWILIO TOOL: Sending SMS to {to_phone_number}")
-    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    logger.info("TWILIO TOOL: Sending SMS to %s", to_phone_number)
+    client = _client()
     try:
         message = client.messages.create(
             to=to_phone_number,
-            from_=settings.TWILIO_PHONE_NUMBER,
+            from_=get_settings().TWILIO_PHONE_NUMBER,
             body=message
         )
         return {"sid": message.sid, "status": message.status}
     except Exception as e:
-        print(f"TWILIO TOOL: Error sending SMS: {e}")
+        logger.exception("TWILIO TOOL: Error sending SMS to %s", to_phone_number)
         return {"error": str(e)}
 
+# Matches urllib3's default per-host pool, so every worker keeps a live
+# connection instead of opening and discarding extras
+SMS_BULK_WORKERS = 10
+_SMS_POOL = ThreadPoolExecutor(max_workers=SMS_BULK_WORKERS, thread_name_prefix="twilio-sms")
+
+def send_sms_bulk(messages: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    """
+    Sends many SMS messages concurrently, so a broadcast takes about as long
+    as the slowest send rather than the sum of all of them.
+
+    Args:
+        messages: (to_phone_number, message) pairs.
+
+    Returns:
+        One send_sms result per pair, in the same order.
+    """
+    return list(_SMS_POOL.map(lambda m: send_sms(*m), messages))
+
 def make_call(to_phone_number: str, twiml_url: str) -> Dict[str, Any]:
     """
     Makes an automated voice call using Twilio.
@@ -59,15 +94,15 @@ def make_call(to_phone_number: str, twiml_url: str) -> Dict[str, Any]:
     Returns:
         A dictionary containing the Twilio call SID and status.
     """
-    print(f"TWILIO TOOL: Error making call: {to_phone_number}")
-    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    logger.info("TWILIO TOOL: Making call to %s", to_phone_number)
+    client = _client()
     try:
         call = client.calls.create(
             to=to_phone_number,
-            from_=settings.TWILIO_PHONE_NUMBER,
+            from_=get_settings().TWILIO_PHONE_NUMBER,
             url=twiml_url
         )
         return {"sid": call.sid, "status": call.status}
     except Exception as e:
-        print(f"TWILIO TOOL: Error making call: {e}")
+        logger.exception("TWILIO TOOL: Error making call to %s", to_phone_number)
         return {"error": str(e)}
\ No newline at end of file
@@ -0,0 +1,24 @@
+import functools
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = "RitveerBot/1.0"
+
+@functools.lru_cache(maxsize=1)
+def get_http_session() -> requests.Session:
+    """
+    Process-wide requests.Session for the blocking HTTP tools, so every
+    upstream host keeps one pool of live TLS connections however many tools
+    call it. Per-service auth goes in per-request headers, never on the session.
+    """
+    session = requests.Session()
+    # Connection errors are retried for every method; 5xx only for idempotent
+    # ones, so a create POST that reached the upstream is never sent twice
+    adapter = HTTPAdapter(
+        pool_connections=64, pool_maxsize=128,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
@@ -1,27 +1,70 @@
+import atexit
 import logging
+import logging.handlers
 import os
-from config.settings import settings
+import queue
+import threading
+import time
+from config.settings import get_settings
+
+# File records are written in batches: when this many are buffered, on any
+# ERROR, on the periodic flush below, and at interpreter shutdown
+LOG_BUFFER_RECORDS = 1024
+LOG_FLUSH_INTERVAL_S = 1.0
+
+def _flush_periodically(handler: logging.Handler, interval_s: float) -> None:
+    while True:
+        time.sleep(interval_s)
+        handler.flush()
+
+_configured = False
 
 def setup_logging():
     """
-    Sets up the logging configuration for the application.
+    Sets up the logging configuration for the application. Call it once per
+    process, from the entrypoint, after any fork: the listener and flush
+    threads don't survive a fork. Later calls are no-ops.
     """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
     log_level = os.environ.get("LOG_LEVEL", "INFO").upper()
-    log_file = settings.LOG_FILE_PATH # Assuming LOG_FILE_PATH is defined in settings
+    log_file = get_settings().LOG_FILE_PATH # Assuming LOG_FILE_PATH is defined in settings
 
     # Create logs directory if it doesn't exist
     log_dir = os.path.dirname(log_file)
     if log_dir and not os.path.exists(log_dir):
         os.makedirs(log_dir)
 
+    buffered_file = logging.handlers.MemoryHandler(
+        capacity=LOG_BUFFER_RECORDS,
+        flushLevel=logging.ERROR,
+        target=logging.FileHandler(log_file),
+        flushOnClose=True,
+    )
+    # Callers only enqueue; one listener thread does the console and file I/O.
+    # The QueueHandler formats each record, so the sinks write it as is
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        log_queue,
+        logging.StreamHandler(), # Log to console
+        buffered_file, # Log to file, one write per batch
+        respect_handler_level=True,
+    )
     logging.basicConfig(
         level=log_level,
         format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(), # Log to console
-            logging.FileHandler(log_file) # Log to file
-        ]
+        handlers=[logging.handlers.QueueHandler(log_queue)],
+        force=True,  # replace, don't stack on, whatever an import left on the root logger
     )
+    listener.start()
+    # Drains the queue at exit, ahead of logging's own shutdown flush
+    atexit.register(listener.stop)
+    # Keeps a quiet log from sitting in the buffer indefinitely
+    threading.Thread(target=_flush_periodically, args=(buffered_file, LOG_FLUSH_INTERVAL_S),
+                     name="log-flush", daemon=True).start()
 
     # Set specific log levels for some modules if needed
     logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -34,6 +77,3 @@ def get_logger(name: str) -> logging.Logger:
     Returns a logger instance with the given name.
     """
     return logging.getLogger(name)
-
-# Call setup_logging once when the module is imported
-setup_logging()
@@ -1,24 +1,100 @@
 import redis
+import redis.asyncio
+import functools
 import json
-from typing import Dict, Any
-from config.settings import settings
-
-# Initialize Redis client
+import logging
+import socket
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
 try:
-    redis_client = redis.Redis(
+    import orjson
+except ImportError:  # optional; stdlib json is the fallback
+    orjson = None
+from typing import Dict, Any, List
+from config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Idle sockets are probed so NAT and load balancer timeouts are noticed
+# before a write needs the connection (the constants are Linux-only)
+_KEEPALIVE_OPTIONS = {
+    opt: value
+    for name, value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3))
+    if (opt := getattr(socket, name, None)) is not None
+}
+
+@functools.lru_cache(maxsize=1)
+def get_redis_client() -> redis.Redis | None:
+    """
+    Returns the process-wide blocking Redis client, connecting on first use,
+    or None when Redis was unreachable then.
+    """
+    settings = get_settings()
+    client = redis.Redis(connection_pool=redis.BlockingConnectionPool(
         host=settings.REDIS_HOST,
         port=settings.REDIS_PORT,
         db=settings.REDIS_DB,
-        decode_responses=True
-    )
-    redis_client.ping()
-    print("RedisUtils: Successfully connected to Redis.")
-except redis.exceptions.ConnectionError as e:
-    print(f"RedisUtils: Could not connect to Redis: {e}")
-    redis_client = None
+        decode_responses=True,
+        max_connections=32,
+        socket_keepalive=True,
+        socket_keepalive_options=_KEEPALIVE_OPTIONS,
+        health_check_interval=30,
+        # Transient drops are retried with backoff instead of reaching callers
+        retry=Retry(ExponentialBackoff(), 3),
+        retry_on_error=[redis.exceptions.ConnectionError, redis.exceptions.TimeoutError],
+    ))
+    try:
+        client.ping()
+    except redis.exceptions.ConnectionError as e:
+        logger.warning("RedisUtils: Could not connect to Redis: %s", e)
+        return None
+    logger.info("RedisUtils: Successfully connected to Redis.")
+    return client
 
 REDIS_RETRY_STREAM = "ritveer_retry_stream"
 
+# Check-and-expire in one atomic round-trip, so a failure between the two
+# calls can't leave a key without a TTL
+DEDUPE_LUA = """
+if redis.call('SETNX', KEYS[1], 1) == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return 1
+end
+return 0
+"""
+RATE_LUA = """
+local c = redis.call('INCR', KEYS[1])
+if c == 1 then
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+end
+return c
+"""
+
+_async_redis_client: redis.asyncio.Redis | None = None
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """
+    Returns the process-wide asyncio Redis client for use inside async nodes.
+    The client connects lazily, so this never blocks.
+    """
+    global _async_redis_client
+    if _async_redis_client is None:
+        settings = get_settings()
+        _async_redis_client = redis.asyncio.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True
+        )
+    return _async_redis_client
+
+def _dumps(obj: Any) -> bytes:
+    # Stream payloads are written as bytes; decode_responses only affects
+    # replies, so orjson's output goes out without a decode/encode round trip
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, default=str).encode()
+
 def add_to_retry_stream(task_details: Dict[str, Any]) -> bool:
     """
     Adds a failed task to a Redis Stream for later retry.
@@ -30,15 +106,49 @@ def add_to_retry_stream(task_details: Dict[str, Any]) -> bool:
     Returns:
         True if the task was added to the stream, False otherwise.
     """
+    redis_client = get_redis_client()
+    if not redis_client:
+        logger.warning("RedisUtils: Not connected to Redis. Cannot add task to retry stream.")
+        return False
+
+    try:
+        # Add the task details as a JSON string to the Redis Stream; MAXLEN ~
+        # lets Redis trim the oldest entries cheaply at node boundaries
+        redis_client.xadd(REDIS_RETRY_STREAM, {"task": _dumps(task_details)},
+                          maxlen=get_settings().RETRY_STREAM_MAXLEN, approximate=True)
+        logger.info("RedisUtils: Added task to retry stream: %s", task_details.get('tool', 'unknown'))
+        return True
+    except Exception:
+        logger.exception("RedisUtils: Error adding task to retry stream")
+        return False
+
+def add_many_to_retry_stream(tasks: List[Dict[str, Any]]) -> bool:
+    """
+    Adds several failed tasks to the retry stream in one round trip; the
+    XADDs are pipelined rather than sent and acknowledged one by one.
+
+    Args:
+        tasks: Task details dictionaries, as for add_to_retry_stream.
+
+    Returns:
+        True if every task was added to the stream, False otherwise.
+    """
+    if not tasks:
+        return True
+    redis_client = get_redis_client()
     if not redis_client:
-        print("RedisUtils: Not connected to Redis. Cannot add task to retry stream.")
+        logger.warning("RedisUtils: Not connected to Redis. Cannot add tasks to retry stream.")
         return False
 
     try:
-        # Add the task details as a JSON string to the Redis Stream
-        redis_client.xadd(REDIS_RETRY_STREAM, {"task": json.dumps(task_details)})
-        print(f"RedisUtils: Added task to retry stream: {task_details.get('tool', 'unknown')}")
+        maxlen = get_settings().RETRY_STREAM_MAXLEN
+        pipe = redis_client.pipeline(transaction=False)
+        for task_details in tasks:
+            pipe.xadd(REDIS_RETRY_STREAM, {"task": _dumps(task_details)},
+                      maxlen=maxlen, approximate=True)
+        pipe.execute()
+        logger.info("RedisUtils: Added %d tasks to retry stream", len(tasks))
         return True
-    except Exception as e:
-        print(f"RedisUtils: Error adding task to retry stream: {e}")
+    except Exception:
+        logger.exception("RedisUtils: Error adding tasks to retry stream")
         return False
@@ -0,0 +1,10 @@
+from src.tools.messaging.telegram_client import TelegramClient
+
+_telegram_client: TelegramClient | None = None
+
+def get_telegram_client() -> TelegramClient:
+    """Process-wide TelegramClient, created on first use so its HTTP session is reused across sends"""
+    global _telegram_client
+    if _telegram_client is None:
+        _telegram_client = TelegramClient()
+    return _telegram_client
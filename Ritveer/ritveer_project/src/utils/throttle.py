@@ -0,0 +1,48 @@
+import asyncio
+import time
+from typing import Dict
+
+
+class SendThrottle:
+    """
+    Spaces out outbound sends so they stay under a global rate and a
+    per-key (e.g. per-chat) rate, instead of bursting into 429s.
+
+    Each call reserves the next free slot synchronously before sleeping,
+    so concurrent coroutines on one event loop never claim the same slot.
+    With max_backlog set, a key that already has that many sends waiting
+    is refused instead, so one slow chat can't pile up sleepers without
+    bound.
+    """
+
+    def __init__(self, global_per_s: float, per_key_per_s: float, max_backlog: int | None = None):
+        self._global_gap = 1.0 / global_per_s
+        self._key_gap = 1.0 / per_key_per_s
+        self._max_backlog = max_backlog
+        self._next_global = 0.0
+        self._next_by_key: Dict[str, float] = {}
+
+    async def wait(self, key: str, force: bool = False) -> bool:
+        """
+        Sleeps until a send for `key` is allowed and returns True, or returns
+        False at once if the key's backlog is full. `force` skips the backlog
+        check, for a follow-up send that must go out with an accepted one.
+        """
+        now = time.monotonic()
+        if self._max_backlog is not None and not force:
+            backlog = (self._next_by_key.get(key, 0.0) - now) / self._key_gap
+            if backlog >= self._max_backlog:
+                return False
+        slot = max(now, self._next_global, self._next_by_key.get(key, 0.0))
+        self._next_global = slot + self._global_gap
+        self._next_by_key[key] = slot + self._key_gap
+        if len(self._next_by_key) > 1024:
+            # Keys whose next slot has passed carry no state worth keeping
+            self._next_by_key = {k: t for k, t in self._next_by_key.items() if t > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+        return True
+
+
+# Telegram Bot API guidance: ~30 messages/s overall, ~1 message/s per chat
+telegram_throttle = SendThrottle(global_per_s=30, per_key_per_s=1, max_backlog=64)
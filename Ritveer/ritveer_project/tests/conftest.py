@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Modules import both "src.…" and "ritveer_project.src.…", as main.py sets up
+_PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (_PROJECT, os.path.dirname(_PROJECT)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,36 @@
+import asyncio
+
+from src.graph.state import IntakeOutput
+from src.graph.workflow import intake_node, intake_router, route_intake
+
+
+def _webhook_state(risk_flags):
+    # The shape api/webhooks.py hands the graph
+    return {
+        "raw_message": "need 10 kg clay delivered to pune",
+        "channel": "whatsapp",
+        "intake": {"request_id": "req_test", "risk_flags": list(risk_flags)},
+    }
+
+
+def test_invalid_signature_routes_to_guard():
+    state = asyncio.run(intake_node(_webhook_state(["invalid_signature"])))
+    assert "invalid_signature" in state["intake"]["risk_flags"]
+    assert state["intake"]["next_actions_hint"] == "guard_agent"
+    assert intake_router(state) == "Guard"
+
+
+def test_signed_request_skips_guard():
+    state = asyncio.run(intake_node(_webhook_state([])))
+    assert "invalid_signature" not in state["intake"]["risk_flags"]
+    assert intake_router(state) != "Guard"
+
+
+def test_route_intake_guard_flag_wins():
+    intake = IntakeOutput(
+        request_id="req_12345678", conversation_id="conv_req_12345678", customer_id=None,
+        channel="whatsapp", raw_text="hi", language="en", translated_text=None,
+        intent="unsupported", intent_confidence=0.0, slot_gaps=["category"],
+        risk_flags=["invalid_signature"], next_actions_hint=None,
+    )
+    assert route_intake(intake) == "Guard"